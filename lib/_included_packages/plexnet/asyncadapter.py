@@ -1,6 +1,9 @@
 from __future__ import absolute_import
 import time
 import socket
+import threading
+import weakref
+import select
 import six
 
 import requests
@@ -35,6 +38,11 @@ WIN_EHOSTUNREACH = 10065
 
 MAX_RETRIES = 3
 
+# how often a pending connect re-checks ABORT_FLAG_FUNCTION (s); cancel() wakes it immediately
+ABORT_POLL_INTERVAL = 0.1
+
+HAS_POLL = hasattr(select, 'poll')
+
 
 def ABORT_FLAG_FUNCTION():
     return False
@@ -79,18 +87,67 @@ class AsyncTimeout(float):
 DEFAULT_TIMEOUT = AsyncTimeout(10).setConnectTimeout(10)
 
 
-class AsyncVerifiedHTTPSConnection(VerifiedHTTPSConnection):
-    __slots__ = ("_canceled", "deadline", "_timeout")
+class ConnectionStats(object):
+    """
+    Counts how often a pooled connection was reused versus a new one having to be opened
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reused = 0
+        self.new = 0
 
-    def __init__(self, *args, **kwargs):
-        VerifiedHTTPSConnection.__init__(self, *args, **kwargs)
-        self._canceled = False
-        self.deadline = 0
-        self._timeout = AsyncTimeout(DEFAULT_TIMEOUT)
+    def __repr__(self):
+        total = self.reused + self.new
+        return '<ConnectionStats reused: {0} new: {1} ({2:.1f}% reused)>'.format(
+            self.reused, self.new, total and self.reused * 100.0 / total or 0.0)
+
+    def __str__(self):
+        return repr(self)
 
-    def _check_timeout(self):
-        if time.time() > self.deadline:
-            raise ConnectTimeoutError('connection timed out')
+    def count(self, reused):
+        with self.lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.new += 1
+
+    def reset(self):
+        with self.lock:
+            self.reused = 0
+            self.new = 0
+
+
+STATS = ConnectionStats()
+
+# the Session currently sending a request on this thread and the scope of the work running on it (see setRequestOwner);
+# used to attribute checked out connections to them
+_OWNER = threading.local()
+
+
+def setRequestOwner(owner=None, canceled=None):
+    """
+    Attribute the connections this thread checks out to owner until reset, so AdapterPool.cancel(owner) aborts them;
+    canceled is a callable telling whether the work has been canceled, which keeps it from opening new connections.
+    """
+    _OWNER.scope = owner
+    _OWNER.canceled = canceled
+
+
+def ownerCanceled():
+    """Whether the work running on this thread has been canceled; its requests failing is expected then."""
+    canceled = getattr(_OWNER, 'canceled', None)
+    return bool(canceled and canceled())
+
+
+class AsyncConnectionMixin(object):
+    """
+    Non-blocking connect which waits for writability with select/poll until the connect deadline passes. A canceled
+    connection wakes the wait immediately through a socket pair; ABORT_FLAG_FUNCTION can't notify us, so it is polled
+    every ABORT_POLL_INTERVAL seconds.
+    """
+    _canceled = False
+    _waker = None
+    deadline = 0
 
     def create_connection(self, address, timeout=None, source_address=None):
         """Connect to *address* and return the socket object.
@@ -114,22 +171,20 @@ class AsyncVerifiedHTTPSConnection(VerifiedHTTPSConnection):
             sock = None
             try:
                 sock = socket.socket(af, socktype, proto)
+                for opt in getattr(self, 'socket_options', None) or ():
+                    sock.setsockopt(*opt)
                 sock.setblocking(False)  # this is obviously critical
                 self.deadline = time.time() + timeout.getConnectTimeout()
-                # sock.settimeout(timeout)
 
                 if source_address:
                     sock.bind(source_address)
-                for msg in self._connect(sock, sa):
-                    if self._canceled or ABORT_FLAG_FUNCTION():
-                        raise CanceledException('Request canceled')
+                self._connect(sock, sa)
                 sock.setblocking(True)
                 return sock
 
             except socket.error as _:
                 err = _
                 if sock is not None:
-                    sock.shutdown(socket.SHUT_RDWR)
                     sock.close()
 
         if err is not None:
@@ -137,26 +192,36 @@ class AsyncVerifiedHTTPSConnection(VerifiedHTTPSConnection):
         else:
             raise socket.error("getaddrinfo returns an empty list")
 
-    def _connect(self, sock, sa):
-        while not self._canceled and not ABORT_FLAG_FUNCTION():
-            time.sleep(0.01)
-            self._check_timeout()  # this should be done at the beginning of each loop
-            status = sock.connect_ex(sa)
-            if not status or status in (errno.EISCONN, WIN_EISCONN):
-                break
-            elif status in (errno.EINPROGRESS, WIN_EWOULDBLOCK):
-                self.deadline = time.time() + self._timeout.getConnectTimeout()
-            # elif status in (errno.EWOULDBLOCK, errno.EALREADY) or (os.name == 'nt' and status == errno.WSAEINVAL):
-            #     pass
-            yield
-
+    def _checkCanceled(self):
         if self._canceled or ABORT_FLAG_FUNCTION():
             raise CanceledException('Request canceled')
 
+    def _connect(self, sock, sa):
+        self._checkCanceled()
+
+        status = sock.connect_ex(sa)
+        if not status or status in (errno.EISCONN, WIN_EISCONN):
+            return
+
+        if status not in (errno.EINPROGRESS, errno.EWOULDBLOCK, WIN_EWOULDBLOCK):
+            raise socket.error(status, errno.errorcode.get(status, 'connect failed'))
+
+        self._waker = socket.socketpair()
+        try:
+            while not _waitWritable(sock, self._waker[0], min(self.deadline - time.time(), ABORT_POLL_INTERVAL)):
+                self._checkCanceled()
+                if time.time() > self.deadline:
+                    raise ConnectTimeoutError('connection timed out')
+        finally:
+            waker, self._waker = self._waker, None
+            for s in waker:
+                s.close()
+
+        self._checkCanceled()
+
         error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
         if error:
-            # TODO: determine when this case can actually happen
-            raise socket.error((error,))
+            raise socket.error(error, errno.errorcode.get(error, 'connect failed'))
 
     def _new_conn(self):
         sock = self.create_connection(
@@ -168,26 +233,85 @@ class AsyncVerifiedHTTPSConnection(VerifiedHTTPSConnection):
 
     def cancel(self):
         self._canceled = True
+        waker = self._waker
+        if waker:
+            try:
+                waker[1].send(b'\0')
+            except socket.error:
+                pass
+
+        # abort a request in progress on an established connection
+        sock = getattr(self, 'sock', None)
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except (socket.error, OSError):
+                pass
+
+
+def _waitWritable(sock, waker, timeout):
+    """
+    Wait until sock is writable (connected or failed) or waker became readable; returns False when timeout passed
+    without either happening.
+    """
+    timeout = max(timeout, 0)
+    if HAS_POLL:
+        poller = select.poll()
+        poller.register(sock, select.POLLOUT | select.POLLERR | select.POLLHUP)
+        poller.register(waker, select.POLLIN)
+        return bool(poller.poll(timeout * 1000))
+
+    r, w, x = select.select([waker], [sock], [sock], timeout)
+    return bool(r or w or x)
+
+
+class AsyncVerifiedHTTPSConnection(AsyncConnectionMixin, VerifiedHTTPSConnection):
+    __slots__ = ("_canceled", "deadline", "_timeout")
+
+    def __init__(self, *args, **kwargs):
+        VerifiedHTTPSConnection.__init__(self, *args, **kwargs)
+        self._canceled = False
+        self.deadline = 0
+        self._timeout = AsyncTimeout(DEFAULT_TIMEOUT)
+
 
+class AsyncHTTPConnection(AsyncConnectionMixin, HTTPConnection):
+    __slots__ = ("_canceled", "deadline", "_timeout")
 
-class AsyncHTTPConnection(HTTPConnection):
-    __slots__ = ("_canceled", "deadline")
     def __init__(self, *args, **kwargs):
         HTTPConnection.__init__(self, *args, **kwargs)
         self._canceled = False
         self.deadline = 0
+        self._timeout = AsyncTimeout(DEFAULT_TIMEOUT)
 
-    def cancel(self):
-        self._canceled = True
 
+class AsyncPoolMixin(object):
+    adapter = None
 
-class AsyncHTTPConnectionPool(HTTPConnectionPool):
-    __slots__ = ("connections",)
+    def _get_conn(self, timeout=None):
+        conn = super(AsyncPoolMixin, self)._get_conn(timeout=timeout)
 
-    def __init__(self, *args, **kwargs):
-        HTTPConnectionPool.__init__(self, *args, **kwargs)
-        self.connections = []
+        # a connection which still has its socket is a kept-alive one
+        STATS.count(getattr(conn, 'sock', None) is not None)
+
+        if self.adapter:
+            self.adapter.checkOut(conn)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            if self.adapter:
+                self.adapter.checkIn(conn)
+
+            # never hand out a connection that has been canceled
+            if getattr(conn, '_canceled', False):
+                conn.close()
+                conn = None
 
+        super(AsyncPoolMixin, self)._put_conn(conn)
+
+
+class AsyncHTTPConnectionPool(AsyncPoolMixin, HTTPConnectionPool):
     def _new_conn(self):
         """
         Return a fresh :class:`httplib.HTTPConnection`.
@@ -207,22 +331,10 @@ class AsyncHTTPConnectionPool(HTTPConnectionPool):
             # Mark this connection as not reusable
             conn.auto_open = 0
 
-        self.connections.append(conn)
-
         return conn
 
-    def cancel(self):
-        for c in self.connections:
-            c.cancel()
-
-
-class AsyncHTTPSConnectionPool(HTTPSConnectionPool):
-    __slots__ = ("connections",)
-
-    def __init__(self, *args, **kwargs):
-        HTTPSConnectionPool.__init__(self, *args, **kwargs)
-        self.connections = []
 
+class AsyncHTTPSConnectionPool(AsyncPoolMixin, HTTPSConnectionPool):
     def _new_conn(self):
         """
         Return a fresh :class:`httplib.HTTPSConnection`.
@@ -242,18 +354,12 @@ class AsyncHTTPSConnectionPool(HTTPSConnectionPool):
             extra_params['strict'] = self.strict
         connection = connection_class(host=actual_host, port=actual_port, timeout=self.timeout.connect_timeout, **extra_params)
 
-        self.connections.append(connection)
-
         try:
             return self._prepare_conn(connection)
         except AttributeError:
             # urllib3 2.1.0
             return connection
 
-    def cancel(self):
-        for c in self.connections:
-            c.cancel()
-
 
 pool_classes_by_scheme = {
     'http': AsyncHTTPConnectionPool,
@@ -262,6 +368,8 @@ pool_classes_by_scheme = {
 
 
 class AsyncPoolManager(PoolManager):
+    adapter = None
+
     def _new_pool(self, scheme, host, port, request_context=None):
         """
         Create a new :class:`ConnectionPool` based on host, port and scheme.
@@ -277,12 +385,32 @@ class AsyncPoolManager(PoolManager):
             for kw in SSL_KEYWORDS:
                 kwargs.pop(kw, None)
 
-        return pool_cls(host, port, **kwargs)
+        pool = pool_cls(host, port, **kwargs)
+        pool.adapter = self.adapter
+        return pool
 
 
 class AsyncHTTPAdapter(HTTPAdapter):
-    def cancel(self):
-        for c in self.connections:
+    def checkOut(self, conn):
+        with self._lock:
+            self._checkedOut[conn] = (getattr(_OWNER, 'session', None), getattr(_OWNER, 'scope', None))
+
+        if ownerCanceled():
+            conn.cancel()
+
+    def checkIn(self, conn):
+        with self._lock:
+            self._checkedOut.pop(conn, None)
+
+    def cancel(self, owner=None):
+        """
+        Cancel the connections currently in use by owner (a Session or a request owner), or all of them if no owner is
+        given
+        """
+        with self._lock:
+            conns = [c for c, owners in self._checkedOut.items() if owner is None or any(o is owner for o in owners)]
+
+        for c in conns:
             c.cancel()
 
     def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK):
@@ -300,7 +428,10 @@ class AsyncHTTPAdapter(HTTPAdapter):
         self._pool_block = block
 
         self.poolmanager = AsyncPoolManager(num_pools=connections, maxsize=maxsize, block=block)
-        self.connections = []
+        self.poolmanager.adapter = self
+        self._lock = threading.Lock()
+        # connections currently handed out, mapped to the Session they were handed out to
+        self._checkedOut = weakref.WeakKeyDictionary()
 
     def get_connection(self, url, proxies=None):
         """Returns a urllib3 connection for the given URL. This should not be
@@ -332,17 +463,76 @@ class AsyncHTTPAdapter(HTTPAdapter):
             url = parsed.geturl()
             conn = self.poolmanager.connection_from_url(url)
 
-        self.connections.append(conn)
         return conn
 
 
+class AdapterPool(object):
+    """
+    Process-wide registry of adapters, keyed by (scheme, host, port, verify bundle), so that every Session talking to
+    the same endpoint shares its kept-alive connections.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._adapters = {}
+
+    def get(self, url, verify=True):
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        port = parsed.port or (scheme == 'https' and 443 or 80)
+        key = (scheme, (parsed.hostname or '').lower(), port, verify if scheme == 'https' else None)
+
+        with self._lock:
+            adapter = self._adapters.get(key)
+            if adapter is None:
+                adapter = self._adapters[key] = AsyncHTTPAdapter(max_retries=MAX_RETRIES)
+
+        return adapter
+
+    def cancel(self, owner):
+        """
+        Cancel the connections in use by owner on all endpoints
+        """
+        with self._lock:
+            adapters = list(self._adapters.values())
+
+        for adapter in adapters:
+            adapter.cancel(owner)
+
+    def closeAll(self):
+        with self._lock:
+            adapters = list(self._adapters.values())
+            self._adapters.clear()
+
+        for adapter in adapters:
+            adapter.cancel()
+            adapter.close()
+
+
+POOL = AdapterPool()
+
+
 class Session(requests.Session):
     def __init__(self, *args, **kwargs):
         requests.Session.__init__(self, *args, **kwargs)
-        self.mount('https://', AsyncHTTPAdapter(max_retries=MAX_RETRIES))
-        self.mount('http://', AsyncHTTPAdapter(max_retries=MAX_RETRIES))
+        self._usedAdapters = set()
+
+    def get_adapter(self, url):
+        if not url.lower().startswith(('http://', 'https://')):
+            return requests.Session.get_adapter(self, url)
+
+        adapter = POOL.get(url, self.verify)
+        self._usedAdapters.add(adapter)
+        return adapter
+
+    def send(self, request, **kwargs):
+        previous = getattr(_OWNER, 'session', None)
+        _OWNER.session = self
+        try:
+            return requests.Session.send(self, request, **kwargs)
+        finally:
+            _OWNER.session = previous
 
     def cancel(self):
-        for v in self.adapters.values():
-            v.close()
-            v.cancel()
+        # only cancel our own connections; the adapters are shared with other sessions
+        for adapter in list(self._usedAdapters):
+            adapter.cancel(self)
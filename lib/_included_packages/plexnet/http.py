@@ -7,6 +7,7 @@ import requests
 import socket
 import urllib3
 import datetime
+import time
 from . import threadutils
 import six.moves.urllib.request, six.moves.urllib.parse, six.moves.urllib.error
 import mimetypes
@@ -25,6 +26,24 @@ status_codes = requests.status_codes._codes
 
 DEFAULT_TIMEOUT = asyncadapter.AsyncTimeout(util.TIMEOUT).setConnectTimeout(util.TIMEOUT)
 
+# async requests run on a bounded pool of workers; lower priorities are started first
+ASYNC_WORKERS = 8
+REQUEST_PRIORITIES = {
+    "reachability": 0,
+    "account": 0,
+    "sign_in": 0,
+    "resources": 1,
+    "home_users": 1,
+    "timelineUpdate": 3,
+    "publish": 3,
+    "ignored": 3,
+}
+DEFAULT_REQUEST_PRIORITY = 2
+
+EXECUTOR = threadutils.PriorityExecutor('HTTP-ASYNC', maxWorkers=ASYNC_WORKERS)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
 RESOLVED_PD_HOSTS = {}
 
 CURRENT_ACME_CRT_DATE = datetime.date(year=2035, month=6, day=3)
@@ -57,6 +76,50 @@ def pgetaddrinfo(host, port, *args, **kwargs):
 socket.getaddrinfo = pgetaddrinfo
 
 
+def parseResponse(response):
+    """
+    Feed the body of a streamed response into the XML parser while it's being received (and transparently
+    decompressed), instead of reading, decoding and re-encoding it as a whole first.
+
+    Returns the root element (None for an empty body) and the decompressed size of the body.
+    """
+    parser = ElementTree.XMLParser()
+    size = 0
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            parser.feed(chunk)
+    finally:
+        response.close()
+
+    return (parser.close() if size else None), size
+
+
+def iterParse(response):
+    """
+    Incrementally parse the body of a streamed response while it's being received. Yields the root element as soon as
+    its start tag has been parsed (its attributes are complete, its children aren't) and then each of its direct
+    children once it's complete.
+    """
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    depth = 0
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        yield elem
+                else:
+                    depth -= 1
+                    if depth == 1:
+                        yield elem
+        parser.close()
+    finally:
+        response.close()
+
+
 def GET(*args, **kwargs):
     return requests.get(*args, headers=util.BASE_HEADERS.copy(), timeout=DEFAULT_TIMEOUT, **kwargs)
 
@@ -83,7 +146,7 @@ class RequestContext(dict):
 
 class HttpRequest(object):
     __slots__ = ("server", "path", "hasParams", "ignoreResponse", "session", "currentResponse", "method", "url",
-                 "thread", "__dict__")
+                 "job", "__dict__")
     _cancel = False
 
     USE_SYSTEM_CERT_BUNDLE = False
@@ -98,7 +161,7 @@ class HttpRequest(object):
         self.currentResponse = None
         self.method = method
         self.url = url
-        self.thread = None
+        self.job = None
 
         # Use a specific CA cert bundle if applicable
         if not self.USE_SYSTEM_CERT_BUNDLE and util.USE_CERT_BUNDLE != "system" and url[:5] == "https":
@@ -118,9 +181,23 @@ class HttpRequest(object):
         util.APP.delRequest(self)
 
     def startAsync(self, *args, **kwargs):
-        self.thread = threadutils.KillableThread(target=self._startAsync, args=args, kwargs=kwargs, name='HTTP-ASYNC:{0}'.format(self.url))
-        self.thread.start()
-        return True
+        context = kwargs.get('context')
+        timeout = context and context.timeout or DEFAULT_TIMEOUT
+        priority = context and context.priority
+        if priority is None:
+            priority = REQUEST_PRIORITIES.get(context and context.requestType, DEFAULT_REQUEST_PRIORITY)
+
+        # a request that couldn't even be started within its timeout is treated as timed out
+        self.job = EXECUTOR.submit(self._startAsync, args=args, kwargs=kwargs, priority=priority,
+                                   deadline=time.time() + float(timeout),
+                                   onExpired=functools.partial(self._onQueueTimeout, context))
+        return self.job is not None
+
+    def _onQueueTimeout(self, context):
+        util.DEBUG_LOG("Request to {0} expired while queued ({1})", lambda: util.cleanToken(self.url), EXECUTOR)
+        if context:
+            util.APP.onRequestTimeout(context)
+        self.removeAsPending()
 
     def _startAsync(self, body=None, contentType=None, context=None):
         timeout = context and context.timeout or DEFAULT_TIMEOUT
@@ -180,14 +257,14 @@ class HttpRequest(object):
         res = self.getPostWithTimeout(timeout)
         if not res:
             return ''
-        return res.text.encode('utf8')
+        return res.content
 
     def postToStringWithTimeout(self, body=None, timeout=DEFAULT_TIMEOUT):
         self.method = 'POST'
         res = self.getPostWithTimeout(timeout, body)
         if not res:
             return ''
-        return res.text.encode('utf8')
+        return res.content
 
     def getPostWithTimeout(self, timeout=DEFAULT_TIMEOUT, body=None):
         if self._cancel:
@@ -262,6 +339,8 @@ class HttpRequest(object):
 
     def cancel(self):
         self._cancel = True
+        if self.job:
+            self.job.cancel()
         self.session.cancel()
         self.removeAsPending()
         self.killSocket()
@@ -276,10 +355,11 @@ class HttpRequest(object):
     def addHeader(self, name, value):
         self.session.headers[name] = value
 
-    def createRequestContext(self, requestType, callback_=None, timeout=None):
+    def createRequestContext(self, requestType, callback_=None, timeout=None, priority=None):
         context = RequestContext()
         context.requestType = requestType
         context.timeout = timeout or DEFAULT_TIMEOUT
+        context.priority = priority
 
         if callback_:
             context.callback = callback.Callable(self.onResponse)
@@ -299,8 +379,9 @@ class HttpRequest(object):
         if not method:
             method = body is not None and "POST" or "GET"
         util.LOG(
-            "Starting request: {0} {1} (async={2} timeout={3})".format(method, util.cleanToken(self.url),
-                                                                       _async, timeout)
+            "Starting request: {0} {1} (async={2} timeout={3}{4})".format(
+                method, util.cleanToken(self.url), _async, timeout,
+                _async and " queued={0} in-flight={1}".format(EXECUTOR.queueDepth, EXECUTOR.inFlight) or "")
         )
 
 
@@ -327,7 +408,7 @@ class HttpResponse(object):
     def getBodyString(self):
         if self.event is None:
             return ''
-        return self.event.text.encode('utf-8')
+        return self.event.content
 
     def getErrorString(self):
         if self.event is None:
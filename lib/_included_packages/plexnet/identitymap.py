@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+import threading
+import weakref
+
+from . import util
+
+# attributes describing the watch state; a refresh drops them from the shared instance when the new data lacks them
+WATCH_STATE_ATTRIBUTES = ('viewCount', 'viewOffset', 'lastViewedAt')
+
+
+class IdentityMap(object):
+    """
+    Weak map of the metadata objects built for a server, keyed by tag, type and ratingKey, so that an item shows up as
+    the same instance in hubs, the library, preplay and so on. A reload on one screen is visible on all others.
+
+    When an item is built again, the existing instance gets the XML attributes of the new data merged in if its
+    updatedAt or watch state differs or the new data has more attributes. Children (media, streams, ...) are only
+    taken over while the instance hasn't been reloaded, so list data never replaces that of a fully reloaded item.
+    Play queue items and sessions are never shared.
+    """
+    def __init__(self):
+        self.objects = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.refreshed = 0
+
+    def __repr__(self):
+        return '<IdentityMap objects: {0} hits: {1} refreshed: {2}>'.format(len(self.objects), self.hits,
+                                                                             self.refreshed)
+
+    def build(self, cls, elem, initpath, server, container):
+        attrib = elem.attrib
+        ratingKey = attrib.get('ratingKey')
+        if not ratingKey or 'playQueueItemID' in attrib or 'sessionKey' in attrib:
+            return cls(elem, initpath=initpath, server=server, container=container)
+
+        key = (elem.tag, attrib.get('type'), ratingKey)
+        with self.lock:
+            obj = self.objects.get(key)
+
+        if obj is None or obj.deleted:
+            obj = cls(elem, initpath=initpath, server=server, container=container)
+            with self.lock:
+                self.objects[key] = obj
+            return obj
+
+        self.refresh(obj, elem)
+        return obj
+
+    def refresh(self, obj, elem):
+        from . import plexobjects
+
+        attrib = elem.attrib
+        known = obj._attrs or {}
+        if obj.get('updatedAt') == attrib.get('updatedAt', '') and all(k in known for k in attrib) and \
+                all(obj.get(k) == attrib.get(k, '') for k in WATCH_STATE_ATTRIBUTES):
+            self.hits += 1
+            return
+
+        for k in WATCH_STATE_ATTRIBUTES:
+            if k not in attrib and obj.get(k):
+                delattr(obj, k)
+
+        if len(elem) and not obj._reloaded:
+            # the instance only has list data so far; take the children of the new data as well
+            obj._setData(elem)
+        else:
+            plexobjects.PlexObject._setData(obj, elem)
+        self.refreshed += 1
+        util.DEBUG_LOG('Identity map: refreshed {0}', obj)
+
+    def clear(self):
+        with self.lock:
+            self.objects.clear()
@@ -0,0 +1,266 @@
+from __future__ import absolute_import
+import json
+import os
+import sqlite3
+import threading
+import time
+from xml.etree import ElementTree
+
+from . import util
+
+SCHEMA_VERSION = 2
+
+# statements bringing the schema from version n - 1 to n
+MIGRATIONS = {
+    1: (
+        'CREATE TABLE listings (scope TEXT, key TEXT, data TEXT, size INTEGER, fetched REAL, accessed REAL, '
+        'PRIMARY KEY (scope, key))',
+        'CREATE TABLE items (scope TEXT, ratingKey TEXT, updatedAt TEXT, data TEXT, size INTEGER, fetched REAL, '
+        'PRIMARY KEY (scope, ratingKey))',
+        'CREATE TABLE members (scope TEXT, listing TEXT, ratingKey TEXT, PRIMARY KEY (scope, listing, ratingKey))',
+        'CREATE INDEX members_item ON members (scope, ratingKey)',
+    ),
+    2: (
+        'CREATE TABLE snapshots (scope TEXT, key TEXT, data TEXT, size INTEGER, fetched REAL, accessed REAL, '
+        'PRIMARY KEY (scope, key))',
+    ),
+}
+
+TABLES = ('listings', 'items', 'members', 'snapshots')
+
+
+def encodeElement(elem):
+    return [elem.tag, dict(elem.attrib), [encodeElement(child) for child in elem]]
+
+
+def decodeElement(data):
+    tag, attrib, children = data
+    elem = ElementTree.Element(tag, attrib)
+    elem.extend([decodeElement(child) for child in children])
+    return elem
+
+
+class MetadataStore(object):
+    """
+    SQLite store of the raw responses of hub and library listings, per server and user, so the home screen can be drawn
+    from the last known data on start and be revalidated in the background. Snapshots hold arbitrary JSON data of a
+    screen, such as the layout of a library listing.
+
+    A listing keeps its own attributes and the order of its children; children with a ratingKey are kept once per
+    server in the items table and referenced, everything else is inlined. Listings which haven't been read for MAX_AGE
+    days are dropped, and beyond MAX_SIZE bytes the least recently read ones (and snapshots) go first, along with items no
+    listing references anymore.
+    """
+    MAX_SIZE = 32 * 1024 * 1024
+    MAX_AGE = 30
+
+    def __init__(self, path=None):
+        self.path = path
+        self.connection = None
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+    def __repr__(self):
+        return '<MetadataStore hits: {0} misses: {1} saved: {2}>'.format(self.hits, self.misses, self.saved)
+
+    def open(self):
+        if self.connection:
+            return self.connection
+
+        path = self.path or os.path.join(util.translatePath(util.ADDON.getAddonInfo("profile")), "metadata.db")
+        try:
+            self.connection = self.migrate(sqlite3.connect(path, check_same_thread=False))
+        except sqlite3.DatabaseError:
+            util.ERROR("Metadata store: {0} unusable, recreating".format(path))
+            if os.path.exists(path):
+                os.remove(path)
+            self.connection = self.migrate(sqlite3.connect(path, check_same_thread=False))
+        return self.connection
+
+    def migrate(self, connection):
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return connection
+
+        with connection:
+            if version > SCHEMA_VERSION:
+                # written by a newer version; start over
+                util.LOG("Metadata store: schema version {0} is newer than {1}, dropping", version, SCHEMA_VERSION)
+                for table in TABLES:
+                    connection.execute('DROP TABLE IF EXISTS {0}'.format(table))
+                version = 0
+
+            for v in range(version + 1, SCHEMA_VERSION + 1):
+                util.DEBUG_LOG("Metadata store: migrating to schema version {0}", v)
+                for statement in MIGRATIONS[v]:
+                    connection.execute(statement)
+            connection.execute('PRAGMA user_version={0}'.format(SCHEMA_VERSION))
+        return connection
+
+    def save(self, scope, key, elem):
+        items = {}
+        children = []
+        for child in elem:
+            children.append(self._encodeChild(child, items))
+        data = json.dumps([elem.tag, dict(elem.attrib), children], separators=(',', ':'))
+
+        now = time.time()
+        with self.lock:
+            try:
+                connection = self.open()
+                with connection:
+                    previous = [row[0] for row in connection.execute(
+                        'SELECT ratingKey FROM members WHERE scope=? AND listing=?', (scope, key))]
+                    connection.execute('DELETE FROM members WHERE scope=? AND listing=?', (scope, key))
+                    connection.execute('INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?)',
+                                       (scope, key, data, len(data), now, now))
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)',
+                        [(scope, ratingKey, updatedAt, idata, len(idata), now)
+                         for ratingKey, (updatedAt, idata) in items.items()]
+                    )
+                    connection.executemany('INSERT OR IGNORE INTO members VALUES (?, ?, ?)',
+                                           [(scope, key, ratingKey) for ratingKey in items])
+                    connection.executemany(
+                        'DELETE FROM items WHERE scope=? AND ratingKey=? AND NOT EXISTS '
+                        '(SELECT 1 FROM members WHERE scope=? AND ratingKey=?)',
+                        [(scope, ratingKey, scope, ratingKey) for ratingKey in previous if ratingKey not in items]
+                    )
+                    self.evict(connection, now)
+                self.saved += 1
+            except sqlite3.Error:
+                util.ERROR("Metadata store: couldn't save {0}".format(key))
+
+    def load(self, scope, key):
+        """
+        Returns the root element of the listing stored for scope and key, or None.
+        """
+        with self.lock:
+            try:
+                connection = self.open()
+                row = connection.execute('SELECT data FROM listings WHERE scope=? AND key=?', (scope, key)).fetchone()
+                if not row:
+                    self.misses += 1
+                    return None
+
+                items = dict(connection.execute(
+                    'SELECT items.ratingKey, items.data FROM members JOIN items '
+                    'ON items.scope = members.scope AND items.ratingKey = members.ratingKey '
+                    'WHERE members.scope=? AND members.listing=?', (scope, key)
+                ).fetchall())
+                with connection:
+                    connection.execute('UPDATE listings SET accessed=? WHERE scope=? AND key=?',
+                                       (time.time(), scope, key))
+            except sqlite3.Error:
+                util.ERROR("Metadata store: couldn't load {0}".format(key))
+                return None
+
+        elem = self._decodeChild(json.loads(row[0]), items)
+        self.hits += 1
+        return elem
+
+    def saveSnapshot(self, scope, key, data):
+        data = json.dumps(data, separators=(',', ':'))
+        now = time.time()
+        with self.lock:
+            try:
+                connection = self.open()
+                with connection:
+                    connection.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)',
+                                       (scope, key, data, len(data), now, now))
+                    self.evict(connection, now)
+                self.saved += 1
+            except sqlite3.Error:
+                util.ERROR("Metadata store: couldn't save snapshot {0}".format(key))
+
+    def loadSnapshot(self, scope, key):
+        with self.lock:
+            try:
+                connection = self.open()
+                row = connection.execute('SELECT data FROM snapshots WHERE scope=? AND key=?', (scope, key)).fetchone()
+                if not row:
+                    self.misses += 1
+                    return None
+
+                with connection:
+                    connection.execute('UPDATE snapshots SET accessed=? WHERE scope=? AND key=?',
+                                       (time.time(), scope, key))
+            except sqlite3.Error:
+                util.ERROR("Metadata store: couldn't load snapshot {0}".format(key))
+                return None
+
+        self.hits += 1
+        return json.loads(row[0])
+
+    def evict(self, connection, now):
+        connection.execute('DELETE FROM snapshots WHERE accessed < ?', (now - self.MAX_AGE * 86400,))
+        if connection.execute('DELETE FROM listings WHERE accessed < ?', (now - self.MAX_AGE * 86400,)).rowcount:
+            self._removeOrphans(connection)
+
+        while True:
+            size = connection.execute('SELECT (SELECT COALESCE(SUM(size), 0) FROM listings) + '
+                                      '(SELECT COALESCE(SUM(size), 0) FROM items) + '
+                                      '(SELECT COALESCE(SUM(size), 0) FROM snapshots)').fetchone()[0]
+            if size <= self.MAX_SIZE:
+                break
+
+            counts = [connection.execute('SELECT COUNT(*) FROM {0}'.format(table)).fetchone()[0]
+                      for table in ('listings', 'snapshots')]
+            if not any(counts):
+                break
+
+            # drop the least recently read tenth of the listings and snapshots, then everything orphaned by that
+            for table, count in zip(('listings', 'snapshots'), counts):
+                connection.execute('DELETE FROM {0} WHERE rowid IN (SELECT rowid FROM {0} ORDER BY accessed LIMIT ?)'
+                                   .format(table), (max(1, count // 10),))
+            self._removeOrphans(connection)
+
+    def clear(self, scope=None):
+        with self.lock:
+            try:
+                connection = self.open()
+                with connection:
+                    for table in TABLES:
+                        if scope is None:
+                            connection.execute('DELETE FROM {0}'.format(table))
+                        else:
+                            connection.execute('DELETE FROM {0} WHERE scope=?'.format(table), (scope,))
+            except sqlite3.Error:
+                util.ERROR("Metadata store: couldn't clear")
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+    def _removeOrphans(self, connection):
+        connection.execute('DELETE FROM members WHERE NOT EXISTS (SELECT 1 FROM listings '
+                           'WHERE listings.scope = members.scope AND listings.key = members.listing)')
+        connection.execute('DELETE FROM items WHERE NOT EXISTS (SELECT 1 FROM members '
+                           'WHERE members.scope = items.scope AND members.ratingKey = items.ratingKey)')
+
+    def _encodeChild(self, child, items):
+        ratingKey = child.attrib.get('ratingKey')
+        if ratingKey:
+            items[ratingKey] = (child.attrib.get('updatedAt'), json.dumps(encodeElement(child), separators=(',', ':')))
+            return ratingKey
+
+        return [child.tag, dict(child.attrib), [self._encodeChild(c, items) for c in child]]
+
+    def _decodeChild(self, data, items):
+        if not isinstance(data, list):
+            return decodeElement(json.loads(items[data]))
+
+        tag, attrib, children = data
+        elem = ElementTree.Element(tag, attrib)
+        for child in children:
+            elem.append(self._decodeChild(child, items))
+        return elem
+
+
+STORE = MetadataStore()
@@ -100,12 +100,13 @@ class App(signalsmixin.SignalsMixin):
         self.trigger('init')
 
     def cancelAllTimers(self):
-        for timer in self.timers:
+        for timer in list(self.timers):
             timer.cancel()
 
     def preShutdown(self):
         from . import http
         http.HttpRequest._cancel = True
+        http.EXECUTOR.shutdown()
         if self.pendingRequests:
             util.DEBUG_LOG('Closing down {0} App() requests...', lambda: len(self.pendingRequests))
             for k in list(self.pendingRequests.keys()):
@@ -119,19 +120,33 @@ class App(signalsmixin.SignalsMixin):
 
         if SERVERMANAGER.selectedServer:
             util.DEBUG_LOG('Closing server...')
+            util.DEBUG_LOG('Identity map: {0}', SERVERMANAGER.selectedServer.identityMap)
             SERVERMANAGER.selectedServer.close()
 
+        from . import asyncadapter
+        from . import plexserver
+        from . import metadatastore
+        util.DEBUG_LOG('Closing pooled connections: {0}', asyncadapter.STATS)
+        util.DEBUG_LOG('Query coalescing: {0}', plexserver.INFLIGHT)
+        util.DEBUG_LOG('Closing metadata store: {0}', metadatastore.STORE)
+        metadatastore.STORE.close()
+        asyncadapter.POOL.closeAll()
+
     def shutdown(self):
         if self.timers:
             util.DEBUG_LOG('Waiting for {0} App() timers: Started', lambda: len(self.timers))
 
             self.cancelAllTimers()
 
-            for timer in self.timers:
+            for timer in list(self.timers):
                 timer.join()
 
             util.DEBUG_LOG('Waiting for App() timers: Finished')
 
+        from . import threadutils
+        util.DEBUG_LOG('Stopping the timer scheduler: {0}', threadutils.SCHEDULER)
+        threadutils.SCHEDULER.shutdown()
+
 
 class DeviceInfo(object):
     def getCaptionsOption(self, key):
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import random
 import socket
+import time
 
 from . import http
 from . import callback
@@ -85,6 +86,9 @@ class PlexConnection(object):
 
         self.lastTestedAt = 0
         self.hasPendingRequest = False
+        self.raceCanceled = False
+        self.testStartedAt = None
+        self.rtt = None
 
         self.isSecureButLocal = False
 
@@ -200,6 +204,8 @@ class PlexConnection(object):
         self.getScore(True)
 
     def testReachability(self, server, allowFallback=False):
+        self.raceCanceled = False
+
         # Check if we will allow the connection test. If this is a fallback connection,
         # then we will defer it until we "allowFallback" (test insecure connections
         # after secure tests have completed and failed). Insecure connections will be
@@ -240,6 +246,7 @@ class PlexConnection(object):
                                                         timeout=util.CONN_CHECK_TIMEOUT)
             context.server = server
             util.addPlexHeaders(self.request, server.getToken())
+            self.testStartedAt = time.time()
             self.hasPendingRequest = util.APP.startRequest(self.request, context)
             util.DEBUG_LOG("Testing insecure connection for: {0}", server)
             return True
@@ -253,6 +260,8 @@ class PlexConnection(object):
 
     def onReachabilityResponse(self, request, response, context):
         self.hasPendingRequest = False
+        if self.testStartedAt:
+            self.rtt = int((time.time() - self.testStartedAt) * 1000)
         # It's possible we may have a result pending before we were able
         # to cancel it, so we'll just ignore it.
 
@@ -302,14 +311,20 @@ class PlexConnection(object):
 
         return '{0}{1}{2}'.format(self.address, path, param)
 
+    def getPotentialScore(self):
+        # the score this connection would have if it turned out to be reachable
+        score = self.SCORE_REACHABLE
+        if self.isSecure:
+            score += self.SCORE_SECURE
+        if self.isLocal:
+            score += self.SCORE_LOCAL + (not self.isSecure and util.LOCAL_OVER_SECURE and 2 or 0)
+
+        return score
+
     def getScore(self, recalc=False):
         if recalc:
-            self.score = 0
-            if self.state == self.STATE_REACHABLE:
-                self.score += self.SCORE_REACHABLE
-            if self.isSecure:
-                self.score += self.SCORE_SECURE
-            if self.isLocal:
-                self.score += self.SCORE_LOCAL + (not self.isSecure and util.LOCAL_OVER_SECURE and 2 or 0)
+            self.score = self.getPotentialScore()
+            if self.state != self.STATE_REACHABLE:
+                self.score -= self.SCORE_REACHABLE
 
         return self.score
@@ -19,11 +19,15 @@ class Library(plexobjects.PlexObject):
     def __repr__(self):
         return '<Library:{0}>'.format(self.title1.encode('utf8'))
 
-    def sections(self):
+    def sections(self, cached=False):
         items = []
 
         path = '/library/sections'
-        for elem in self.server.query(path):
+        data = self.server.storedQuery(path, cached=cached)
+        if data is None:
+            return None
+
+        for elem in data:
             stype = elem.attrib['type']
             if stype in SECTION_TYPES:
                 cls = SECTION_TYPES[stype]
@@ -171,13 +175,13 @@ class LibrarySection(plexobjects.PlexObject):
 
         return plexobjects.PlexObject.getAbsolutePath(self, key)
 
-    def all(self, start=None, size=None, filter_=None, sort=None, unwatched=False, type_=None):
+    def all(self, start=None, size=None, filter_=None, sort=None, unwatched=False, type_=None, callback=None):
         if self.key.startswith('/'):
             path = '{0}/all'.format(self.key)
         else:
             path = '/library/sections/{0}/all'.format(self.key)
         
-        return self.items(path, start, size, filter_, sort, unwatched, type_, False)
+        return self.items(path, start, size, filter_, sort, unwatched, type_, False, callback=callback)
 
     @property
     def settings(self):
@@ -196,7 +200,7 @@ class LibrarySection(plexobjects.PlexObject):
 
         return self._settings
     
-    def folder(self, start=None, size=None, subDir=False):
+    def folder(self, start=None, size=None, subDir=False, callback=None):
         if self.key.startswith('/'):
             path = self.key
         else:
@@ -205,9 +209,9 @@ class LibrarySection(plexobjects.PlexObject):
         if not subDir:
             path = '{0}/folder'.format(path)
         
-        return self.items(path, start, size, None, None, False, None, True)
+        return self.items(path, start, size, None, None, False, None, True, callback=callback)
 
-    def items(self, path, start, size, filter_, sort, unwatched, type_, tag_fallback):
+    def items(self, path, start, size, filter_, sort, unwatched, type_, tag_fallback, callback=None):
 
         args = {}
 
@@ -240,7 +244,7 @@ class LibrarySection(plexobjects.PlexObject):
         if args:
             path += util.joinArgs(args, '?' not in path)
 
-        return plexobjects.listItems(self.server, path, tag_fallback=tag_fallback)
+        return plexobjects.listItems(self.server, path, tag_fallback=tag_fallback, callback=callback)
 
     def jumpList(self, filter_=None, sort=None, unwatched=False, type_=None):
         if self.key.startswith('/'):
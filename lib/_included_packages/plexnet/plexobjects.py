@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 from datetime import datetime
+from collections import OrderedDict
 
 from . import exceptions
 from . import util
@@ -21,6 +22,51 @@ SEARCHTYPES = {
 
 LIBRARY_TYPES = {}
 
+STRPTIME_CACHE = {}
+STRPTIME_CACHE_SIZE = 4096
+
+CLASS_ATTRIBUTES = {}
+
+# Attributes with few distinct values across a library (or at least within a show/season). Equal values of these are
+# shared between all elements of a response instead of being stored once per element, see internValues.
+INTERNED_ATTRIBUTES = frozenset((
+    'type', 'subtype', 'librarySectionTitle', 'librarySectionID', 'librarySectionKey', 'librarySectionUUID',
+    'contentRating', 'studio', 'year', 'index', 'viewCount', 'art', 'chapterSource', 'audienceRatingImage',
+    'ratingImage', 'originallyAvailableAt',
+    'grandparentTitle', 'grandparentKey', 'grandparentRatingKey', 'grandparentGuid', 'grandparentSlug',
+    'grandparentThumb', 'grandparentArt', 'grandparentTheme',
+    'parentTitle', 'parentKey', 'parentRatingKey', 'parentGuid', 'parentThumb', 'parentIndex', 'parentYear',
+    # Media, Part and Stream
+    'width', 'height', 'aspectRatio', 'audioChannels', 'audioCodec', 'videoCodec', 'videoResolution', 'container',
+    'videoFrameRate', 'audioProfile', 'videoProfile', 'hasThumbnail', 'optimizedForStreaming', 'has64bitOffsets',
+    'codec', 'language', 'languageCode', 'languageTag', 'streamType', 'selected', 'default', 'displayTitle',
+    'extendedDisplayTitle', 'profile', 'bitDepth', 'chromaLocation', 'chromaSubsampling', 'colorPrimaries',
+    'colorRange', 'colorSpace', 'colorTrc', 'frameRate', 'level', 'refFrames', 'scanType', 'samplingRate', 'channels',
+    'audioChannelLayout',
+    # tags (Genre, Director, Role, ...)
+    'tag', 'filter',
+))
+
+BATCH_RELOAD_SIZE = 20
+
+
+def internValues(elem, table=None):
+    """
+    Let all elements of a parsed response share one str per distinct value of the INTERNED_ATTRIBUTES, using a
+    per-response string table. Only the raw attribute values are shared, the PlexValues wrapping them still each get
+    their own parent.
+    """
+    if table is None:
+        table = {}
+
+    for e in elem.iter():
+        attrib = e.attrib
+        for k, v in attrib.items():
+            if k in INTERNED_ATTRIBUTES:
+                attrib[k] = table.setdefault(v, v)
+
+    return table
+
 
 def registerLibType(cls):
     LIBRARY_TYPES[cls.TYPE] = cls
@@ -34,13 +80,39 @@ def registerLibFactory(ftype):
     return wrap
 
 
+def parseDate(value):
+    """
+    Parse a '%Y-%m-%d' date into a local datetime. The same dates come up over and over (air dates of a season, release
+    dates), so the results are shared in STRPTIME_CACHE, keyed by the plain string.
+    """
+    dt = STRPTIME_CACHE.get(value)
+    if dt is not None:
+        return dt
+
+    # dt = datetime.strptime(self, '%Y-%m-%d')
+    # Avoid datetime.strptime to avoid
+    # https://github.com/python/cpython/issues/71587
+    try:
+        dt = datetime.fromtimestamp(time.mktime(time.strptime(value, '%Y-%m-%d')))
+    except OverflowError:
+        # special case for dates before 1970-01-02 (yes, there are shows that old), mktime fails on those
+        year, month, day = (int(p) for p in str(value).split("-"))
+        dt = datetime(year=year, month=month, day=day)
+
+    if len(STRPTIME_CACHE) >= STRPTIME_CACHE_SIZE:
+        STRPTIME_CACHE.clear()
+    STRPTIME_CACHE[six.text_type(value)] = dt
+    return dt
+
+
 class PlexValue(six.text_type):
-    __slots__ = ("parent", "NA")
+    __slots__ = ("parent", "NA", "_converted")
 
     def __new__(cls, value, parent=None):
         self = super(PlexValue, cls).__new__(cls, value)
         self.parent = parent
         self.NA = False
+        self._converted = None
         return self
 
     def __call__(self, default):
@@ -58,36 +130,54 @@ class PlexValue(six.text_type):
     def __lt__(self, other):
         return self.asInt() < other
 
+    def _getConverted(self, key):
+        converted = self._converted
+        if converted is None:
+            converted = self._converted = {}
+            return converted, None
+        return converted, converted.get(key)
+
     def asBool(self):
         return self == '1' or self == 'true'
 
     def asInt(self, default=0):
-        return int(self or default)
+        if not self:
+            return int(default)
+
+        # values are immutable, so are their conversions
+        converted, ret = self._getConverted('int')
+        if ret is None:
+            ret = converted['int'] = int(self)
+        return ret
 
     def asFloat(self, default=0):
-        return float(self or default)
+        if not self:
+            return float(default)
+
+        converted, ret = self._getConverted('float')
+        if ret is None:
+            ret = converted['float'] = float(self)
+        return ret
 
     def asDatetime(self, format_=None):
         if not self:
             return None
 
-        if self.isdigit():
-            dt = datetime.fromtimestamp(int(self))
-        else:
-            # dt = datetime.strptime(self, '%Y-%m-%d')
-            # Avoid datetime.strptime to avoid
-            # https://github.com/python/cpython/issues/71587
-            try:
-                dt = datetime.fromtimestamp(time.mktime(time.strptime(self, '%Y-%m-%d')))
-            except OverflowError:
-                # special case for dates before 1970-01-02 (yes, there are shows that old), mktime fails on those
-                year, month, day = (int(p) for p in str(self).split("-"))
-                dt = datetime(year=year, month=month, day=day)
+        converted, dt = self._getConverted('datetime')
+        if dt is None:
+            if self.isdigit():
+                dt = datetime.fromtimestamp(int(self))
+            else:
+                dt = parseDate(self)
+            converted['datetime'] = dt
 
         if not format_:
             return dt
 
-        return dt.strftime(format_)
+        ret = converted.get(format_)
+        if ret is None:
+            ret = converted[format_] = dt.strftime(format_)
+        return ret
 
     def asURL(self, includeToken=False):
         return self.parent.server.buildUrl(self, includeToken)
@@ -161,8 +251,16 @@ class Checks(object):
         return False
 
 
+def classAttributes(cls):
+    names = CLASS_ATTRIBUTES.get(cls)
+    if names is None:
+        names = CLASS_ATTRIBUTES[cls] = frozenset(dir(cls))
+    return names
+
+
 class PlexObject(Checks):
-    __slots__ = ("initpath", "key", "server", "container", "mediaChoice", "titleSort", "deleted", "_reloaded", "data")
+    __slots__ = ("initpath", "key", "server", "container", "mediaChoice", "titleSort", "deleted", "_reloaded", "data",
+                 "_attrs")
 
     def __init__(self, data, initpath=None, server=None, container=None):
         self.initpath = initpath
@@ -174,6 +272,7 @@ class PlexObject(Checks):
         self.deleted = False
         self._reloaded = False
         self.data = data
+        self._attrs = None
 
         if data is None:
             return
@@ -183,17 +282,61 @@ class PlexObject(Checks):
         self.init(data)
 
     def _setData(self, data):
+        """
+        XML attributes are kept in the element's attrib dict and only wrapped in a PlexValue on first access (see
+        __getattr__), except for those shadowing a class attribute (slots, methods, ...), which are set right away.
+        """
         if data is False:
             return
 
         self.name = data.tag
+        if self._attrs is None:
+            self._attrs = data.attrib
+        else:
+            # a reload; keep attributes the new data doesn't have, drop the values materialized from the old data
+            self._attrs = dict(self._attrs)
+            self._attrs.update(data.attrib)
+            for k in data.attrib:
+                self.__dict__.pop(k == "container" and "attrib_container" or k, None)
+
+        shadowed = classAttributes(self.__class__)
         for k, v in data.attrib.items():
+            if k in shadowed:
+                if k in ("container",):
+                    k = "attrib_%s" % k
+
+                setattr(self, k, PlexValue(v, self))
+
+    def _materialize(self, attr):
+        attrs = self._attrs
+        if not attrs or attr in classAttributes(self.__class__):
+            return None
+
+        v = attrs.get(attr == "attrib_container" and "container" or attr)
+        if v is None:
+            return None
+
+        a = PlexValue(v, self)
+        setattr(self, attr, a)
+        return a
+
+    def _materializeAll(self):
+        for k in self._attrs or ():
             if k in ("container",):
                 k = "attrib_%s" % k
 
-            setattr(self, k, PlexValue(v, self))
+            if k not in self.__dict__:
+                self._materialize(k)
 
     def __getattr__(self, attr):
+        if attr == "_attrs":
+            # not set up (yet), e.g. while copying
+            return None
+
+        a = self._materialize(attr)
+        if a is not None:
+            return a
+
         a = PlexValue('', self)
         a.NA = True
 
@@ -204,12 +347,28 @@ class PlexObject(Checks):
 
         return a
 
+    def __delattr__(self, attr):
+        attrs = self._attrs
+        k = attr == "attrib_container" and "container" or attr
+        pending = bool(attrs) and k in attrs and attr not in classAttributes(self.__class__)
+        if pending:
+            self._attrs = dict(attrs)
+            del self._attrs[k]
+
+        try:
+            object.__delattr__(self, attr)
+        except AttributeError:
+            if not pending:
+                raise
+
     def exists(self, *args, **kwargs):
         # Used for media items - for others we just return True
         return True
 
     def get(self, attr, default=''):
         ret = self.__dict__.get(attr, getattr(self, attr) if attr in self.__slots__ else None)
+        if ret is None:
+            ret = self._materialize(attr)
         return ret is not None and ret or PlexValue(default, self)
 
     def set(self, attr, value):
@@ -230,11 +389,11 @@ class PlexObject(Checks):
 
     @property
     def defaultThumb(self):
-        return self.__dict__.get('thumb') and self.thumb or PlexValue('', self)
+        return self.get('thumb')
 
     @property
     def defaultArt(self):
-        return self.__dict__.get('art') and self.art or PlexValue('', self)
+        return self.get('art')
 
     def refresh(self):
         import requests
@@ -271,6 +430,14 @@ class PlexObject(Checks):
     def softReload(self, **kwargs):
         return self.reload(_soft=True, **kwargs)
 
+    def prepareReload(self, kwargs, soft=False):
+        """ Called before a batched reload; may alter the query params and return state for finishReload. """
+        return None
+
+    def finishReload(self, state):
+        """ Called after a batched reload with the state returned by prepareReload. """
+        pass
+
     def getLibrarySectionId(self):
         ID = self.get('librarySectionID')
 
@@ -417,6 +584,7 @@ class PlexObject(Checks):
         import json
         odict = {}
         if full:
+            self._materializeAll()
             for k, v in self.__dict__.items():
                 if k not in ('server', 'container', 'media', 'initpath', '_data') and v:
                     odict[k] = v
@@ -550,6 +718,8 @@ def buildItem(server, elem, initpath, bytag=False, container=None, tag_fallback=
 
     if libtype in LIBRARY_TYPES:
         cls = LIBRARY_TYPES[libtype]
+        if util.IDENTITY_MAP and getattr(server, 'identityMap', None) is not None:
+            return server.identityMap.build(cls, elem, initpath, server, container)
         return cls(elem, initpath=initpath, server=server, container=container)
     raise exceptions.UnknownType('Unknown library type: {0}'.format(libtype))
 
@@ -566,23 +736,86 @@ class ItemContainer(list):
 
 
 def listItems(server, path, libtype=None, watched=None, bytag=False, data=None, container=None, offset=None,
-              limit=None, tag_fallback=False, **kwargs):
-    data = data if data is not None else server.query(path, offset=offset, limit=limit, **kwargs)
+              limit=None, tag_fallback=False, callback=None, **kwargs):
+    """
+    With a callback, the response is streamed and callback(item) is called for every item as soon as it has been
+    received and built; the full ItemContainer is returned at the end either way.
+    """
+    if callback and data is None:
+        elems = server.streamQuery(path, offset=offset, limit=limit, **kwargs)
+        data = next(elems, None)
+    else:
+        data = data if data is not None else server.query(path, offset=offset, limit=limit, **kwargs)
+        elems = data if data else ()
+
     container = container or PlexContainer(data, path, server, path)
     items = ItemContainer().init(container)
 
-    if data:
-        for elem in data:
-            if libtype and elem.attrib.get('type') != libtype:
-                continue
-            if watched is True and PlexValue(elem.attrib.get('viewCount', "0")).asInt() == 0:
-                continue
-            if watched is False and PlexValue(elem.attrib.get('viewCount', "0")).asInt() >= 1:
-                continue
+    for item in buildItems(server, elems, path, libtype, watched, bytag, container, tag_fallback):
+        items.append(item)
+        if callback:
+            callback(item)
+
+    return items
+
+
+def buildItems(server, elems, initpath, libtype=None, watched=None, bytag=False, container=None, tag_fallback=False):
+    for elem in elems:
+        if libtype and elem.attrib.get('type') != libtype:
+            continue
+        if watched is True and PlexValue(elem.attrib.get('viewCount', "0")).asInt() == 0:
+            continue
+        if watched is False and PlexValue(elem.attrib.get('viewCount', "0")).asInt() >= 1:
+            continue
+        try:
+            yield buildItem(server, elem, initpath, bytag, container, tag_fallback)
+        except exceptions.UnknownType:
+            pass
+
+
+def reloadItems(items, _soft=False, **kwargs):
+    """
+    Reload the data of several objects with as few requests as possible. Objects with a ratingKey are fetched
+    together per server and query params via /library/metadata/<key1>,<key2>,..., in chunks of BATCH_RELOAD_SIZE;
+    others are reloaded one by one.
+    """
+    batches = OrderedDict()
+    for item in items:
+        if _soft and item._reloaded:
+            continue
+
+        if not item.get('ratingKey'):
+            item.reload(_soft=_soft, **kwargs)
+            continue
+
+        params = dict(kwargs)
+        state = item.prepareReload(params, soft=_soft)
+        batches.setdefault((id(item.server), tuple(sorted(params.items()))), []).append((item, state))
+
+    for (serverID, params), pending in batches.items():
+        server = pending[0][0].server
+        for i in range(0, len(pending), BATCH_RELOAD_SIZE):
+            chunk = pending[i:i + BATCH_RELOAD_SIZE]
+            reloaded = False
+            elems = {}
             try:
-                items.append(buildItem(server, elem, path, bytag, container, tag_fallback))
-            except exceptions.UnknownType:
-                pass
+                data = server.query('/library/metadata/{0}'.format(','.join(item.ratingKey for item, state in chunk)),
+                                    params=dict(params))
+                reloaded = True
+                if data is not None:
+                    elems = dict((elem.attrib.get('ratingKey'), elem) for elem in data)
+            except Exception as e:
+                util.ERROR(err=e)
+
+            for item, state in chunk:
+                item._reloaded = item._reloaded or reloaded
+                item.initpath = item.key
+                elem = elems.get(item.ratingKey)
+                if elem is None:
+                    util.DEBUG_LOG('No data on reload: {0}', item)
+                else:
+                    item._setData(elem)
+                item.finishReload(state)
 
     return items
 
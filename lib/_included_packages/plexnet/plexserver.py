@@ -4,6 +4,7 @@ from __future__ import absolute_import
 import time
 import re
 import json
+import threading
 import urllib3.exceptions
 
 from . import http
@@ -17,6 +18,9 @@ from . import plexobjects
 from . import plexresource
 from . import plexlibrary
 from . import asyncadapter
+from . import responsecache
+from . import identitymap
+from . import metadatastore
 from six.moves import range
 # from plexapi.client import Client
 # from plexapi.playqueue import PlayQueue
@@ -25,6 +29,143 @@ from six.moves import range
 TOTAL_QUERIES = 0
 DEFAULT_BASEURI = 'http://localhost:32400'
 
+CONNECTION_ERRORS = (http.requests.ConnectionError, http.requests.exceptions.ChunkedEncodingError,
+                     urllib3.exceptions.ProtocolError)
+
+
+class ReachabilityRace(object):
+    """
+    Happy-eyeballs style reachability testing. Candidates are started best-first with a small stagger (or right away
+    when the previous one failed), the first reachable connection is used immediately and upgraded when a better one
+    answers. Tests that can't beat the connection in use anymore are canceled.
+    """
+    def __init__(self, server, connections, allowFallback=False):
+        self.server = server
+        self.allowFallback = allowFallback
+        self.queue = sorted(connections, key=lambda c: c.getPotentialScore(), reverse=True)
+        self.inFlight = []
+        self.started = time.time()
+        self.firstUsableAt = None
+        self.timer = None
+        self.lock = threading.RLock()
+
+    def _cancelTimer(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+    def startNext(self):
+        with self.lock:
+            self._cancelTimer()
+            while self.queue:
+                conn = self.queue.pop(0)
+                self.inFlight.append(conn)
+                if self.server.startReachabilityTest(conn, self.allowFallback):
+                    break
+                self.inFlight.remove(conn)
+
+            if self.queue:
+                self._cancelTimer()
+                self.timer = util.TIMER(util.RACE_STAGGER, self.startNext,
+                                        name='REACHABILITY-RACE:{0}'.format(self.server.name))
+
+    def onResult(self, conn):
+        with self.lock:
+            if conn in self.inFlight:
+                self.inFlight.remove(conn)
+
+            # don't wait for the stagger when a test failed
+            if conn.state != conn.STATE_REACHABLE and self.queue:
+                self.startNext()
+
+    def settle(self, best):
+        with self.lock:
+            if self.firstUsableAt is None:
+                self.firstUsableAt = time.time()
+                util.LOG("Reachability race for {0}: first usable connection after {1:.0f} ms: {2}",
+                         repr(self.server.name), (self.firstUsableAt - self.started) * 1000, best.address)
+
+            score = best.getScore()
+            self.queue = [c for c in self.queue if c.getPotentialScore() > score]
+            if not self.queue:
+                self._cancelTimer()
+
+            losers = [c for c in self.inFlight if c is not best and c.getPotentialScore() <= score]
+            for conn in losers:
+                self.inFlight.remove(conn)
+
+        for conn in losers:
+            util.DEBUG_LOG("Reachability race for {0}: canceling {1}", repr(self.server.name), conn.address)
+            self.server.cancelReachabilityTest(conn)
+
+    def securePending(self):
+        # a secure candidate is still queued or being tested
+        with self.lock:
+            return any(c.isSecure for c in self.queue + self.inFlight)
+
+    def stop(self):
+        # stop starting new tests, but let the running ones finish
+        with self.lock:
+            self._cancelTimer()
+            del self.queue[:]
+
+
+class QueryFlight(object):
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class InFlightQueries(object):
+    """
+    Single-flight registry for GET queries: concurrent callers asking for the same URL wait for the request that's
+    already in flight and share its parsed result instead of issuing their own.
+    """
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.coalesced = 0
+
+    def __repr__(self):
+        return '<InFlightQueries in flight: {0} coalesced: {1}>'.format(len(self.flights), self.coalesced)
+
+    def run(self, key, func, *args):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = QueryFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            util.DEBUG_LOG('Joining in-flight query ({0} coalesced so far)', self.coalesced)
+            return flight.wait()
+
+        try:
+            flight.result = func(*args)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.event.set()
+
+        return flight.result
+
+
+INFLIGHT = InFlightQueries()
+
 
 class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
     TYPE = 'PLEXSERVER'
@@ -48,12 +189,17 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
 
         self.pendingReachabilityRequests = 0
         self.pendingSecureRequests = 0
+        self.race = None
+        self.optimisticConnection = None
+        self.persistedAddress = None
+        self.rootAttributes = None
 
         self.features = {}
         self.librariesByUuid = {}
 
         self.server = self
         self.session = http.Session()
+        self.identityMap = identitymap.IdentityMap()
 
         self.owner = None
         self.owned = False
@@ -125,7 +271,10 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         data = self.query(key)
         return plexobjects.buildItem(self, data[0], key, container=self)
 
-    def hubs(self, section=None, count=None, search_query=None, section_ids=None, ignore_hubs=None):
+    def hubs(self, section=None, count=None, search_query=None, section_ids=None, ignore_hubs=None, cached=False):
+        """
+        With cached, the hubs are built from the metadata store; None is returned if they haven't been stored yet.
+        """
         hubs = []
 
         params = {"includeMarkers": 1}
@@ -141,6 +290,8 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             q = '/hubs'
             if section:
                 if section == 'playlists':
+                    if cached:
+                        return None
                     audio = plexlibrary.AudioPlaylistHub(False, server=self.server)
                     video = plexlibrary.VideoPlaylistHub(False, server=self.server)
                     if audio.items:
@@ -158,7 +309,9 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             if count is not None:
                 params['count'] = count
 
-        data = self.query(q, params=params)
+        data = self.storedQuery(q, params=params, cached=cached)
+        if data is None:
+            return None
         container = plexobjects.PlexContainer(data, initpath=q, server=self, address=q)
 
         self.currentHubs = {} if self.currentHubs is None else self.currentHubs
@@ -172,7 +325,9 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             if section_ids:
                 cq += util.joinArgs(params)
 
-            cdata = self.query(cq, params=params)
+            cdata = self.storedQuery(cq, params=params, cached=cached)
+            if cdata is None:
+                return None
             ccontainer = plexobjects.PlexContainer(cdata, initpath=cq, server=self, address=cq)
             self.currentHubs[cdata[0].attrib.get('hubIdentifier')] = cdata[0].attrib.get('title')
             hubs.append(plexlibrary.Hub(cdata[0], server=self, container=ccontainer))
@@ -199,12 +354,19 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
 
         return hubs
 
-    def playlists(self, start=0, size=10, hub=None):
+    def playlists(self, start=0, size=10, hub=None, cached=False):
         try:
-            return plexobjects.listItems(self, '/playlists/all')
+            data = self.storedQuery('/playlists/all', cached=cached)
+            if data is None:
+                return None
+            return plexobjects.listItems(self, '/playlists/all', data=data)
         except exceptions.BadRequest:
             return None
 
+    def storedSections(self):
+        """ The library sections as of the last time they were fetched, or None. """
+        return plexlibrary.Library(None, server=self).sections(cached=True)
+
     @property
     def library(self):
         if self.platform == 'cloudsync':
@@ -230,9 +392,76 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             util.WARN_LOG("Server connection is None, returning an empty url")
             return ""
 
+    @property
+    def storeScope(self):
+        return '{0}:{1}'.format(self.uuid, util.ACCOUNT and util.ACCOUNT.ID)
+
+    def storedQuery(self, path, params=None, cached=False):
+        """
+        GET query which keeps its response in the metadata store when that's enabled. With cached, the stored response
+        is returned instead of querying the server, or None if there is none.
+        """
+        key = path + util.joinArgs(params or {}, '?' not in path)
+        if cached:
+            return metadatastore.STORE.load(self.storeScope, key) if util.METADATA_STORE else None
+
+        data = self.query(path, params=params)
+        if util.METADATA_STORE and data is not None:
+            metadatastore.STORE.save(self.storeScope, key, data)
+        return data
+
     def query(self, path, method=None, **kwargs):
         method = method or self.session.get
+        url = self.buildQueryUrl(path, method, kwargs)
+        if not url:
+            return None
+
+        if method.__name__ == 'get':
+            return INFLIGHT.run(url, self._query, method, url, kwargs)
+        return self._query(method, url, kwargs)
+
+    def streamQuery(self, path, **kwargs):
+        """
+        Incremental GET query: yields the response's root element as soon as its start tag has been received and then
+        each of its children as soon as it's complete, while the rest of the body is still downloading. Streamed
+        queries bypass the response cache and in-flight coalescing.
+        """
+        method = self.session.get
+        url = self.buildQueryUrl(path, method, kwargs)
+        if not url:
+            return
+
+        try:
+            response = method(url, stream=True, **kwargs)
+            if response.status_code not in (200, 201):
+                response.close()
+                codename = http.status_codes.get(response.status_code, ['Unknown'])[0]
+                raise exceptions.BadRequest('({0}) {1}'.format(response.status_code, codename))
+
+            table = {}
+            for i, elem in enumerate(http.iterParse(response)):
+                # the root is yielded before its children have been parsed
+                if i:
+                    plexobjects.internValues(elem, table)
+                yield elem
+        except asyncadapter.TimeoutException:
+            util.ERROR()
+            self.onOptimisticConnectionFailed()
+            util.MANAGER.refreshResources(True)
+            return
+        except CONNECTION_ERRORS:
+            if asyncadapter.ownerCanceled():
+                # aborted on purpose; the connection is fine
+                return
+            util.ERROR()
+            self.onOptimisticConnectionFailed()
+            return
+        except asyncadapter.CanceledException:
+            return
+
+        self.optimisticConnection = None
 
+    def buildQueryUrl(self, path, method, kwargs):
         limit = kwargs.pop("limit", None)
         params = kwargs.pop("params", None)
         if params:
@@ -261,23 +490,58 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             url = http.addUrlParam(url, "X-Plex-Container-Size=%s" % limit)
 
         util.LOG('{0} {1}', method.__name__.upper(), re.sub('X-Plex-Token=[^&]+', 'X-Plex-Token=****', url))
+        return url
+
+    def _query(self, method, url, kwargs):
+        cacheKey = cached = None
+        if util.QUERY_CACHE and method.__name__ == 'get':
+            cacheKey = responsecache.CACHE.key(url)
+            cached = responsecache.CACHE.get(cacheKey)
+            if cached:
+                kwargs['headers'] = cached.conditionalHeaders()
+
         try:
-            response = method(url, **kwargs)
+            response = method(url, stream=True, **kwargs)
+            if response.status_code == 304 and cached:
+                response.close()
+                self.optimisticConnection = None
+                return responsecache.CACHE.hit(cached)
+
             if response.status_code not in (200, 201):
+                response.close()
                 codename = http.status_codes.get(response.status_code, ['Unknown'])[0]
                 raise exceptions.BadRequest('({0}) {1}'.format(response.status_code, codename))
-            data = response.text.encode('utf8')
+
+            start = time.time()
+            tree, size = http.parseResponse(response)
+            if tree is not None:
+                plexobjects.internValues(tree)
+            util.DEBUG_LOG('Parsed {0} bytes ({1} on the wire, {2}) in {3:.0f} ms', size,
+                           lambda: response.raw.tell(),
+                           lambda: response.headers.get('Content-Encoding', 'identity'),
+                           (time.time() - start) * 1000)
         except asyncadapter.TimeoutException:
             util.ERROR()
+            self.onOptimisticConnectionFailed()
             util.MANAGER.refreshResources(True)
             return None
-        except (http.requests.ConnectionError, urllib3.exceptions.ProtocolError):
+        except CONNECTION_ERRORS:
+            if asyncadapter.ownerCanceled():
+                # aborted on purpose; the connection is fine
+                return None
             util.ERROR()
+            self.onOptimisticConnectionFailed()
             return None
         except asyncadapter.CanceledException:
             return None
 
-        return ElementTree.fromstring(data) if data else None
+        # the restored connection works for real queries; keep using it
+        self.optimisticConnection = None
+
+        if cacheKey:
+            responsecache.CACHE.store(cacheKey, response, tree, size, revalidated=bool(cached))
+
+        return tree
 
     def getImageTranscodeURL(self, path, width, height, **extraOpts):
         if not path:
@@ -355,6 +619,7 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             util.LOG("Got a reachability response, but from a different server")
             return False
 
+        self.rootAttributes = dict(data.attrib)
         self.serverClass = data.attrib.get('serverClass')
         self.supportsAudioTranscoding = data.attrib.get('transcoderAudio') == '1'
         self.supportsVideoTranscoding = data.attrib.get('transcoderVideo') == '1' or data.attrib.get('transcoderVideoQualities')
@@ -400,11 +665,20 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
         if not force and self.activeConnection and self.activeConnection.state != plexresource.ResourceConnection.STATE_UNKNOWN:
             return
 
+        if self.optimisticConnection:
+            # verify the connection we've restored; all connections are only tested if it fails
+            conn = self.optimisticConnection
+            util.LOG('Verifying restored connection for {0}: {1}', repr(self.name), conn.address)
+            if not conn.hasPendingRequest:
+                self.startReachabilityTest(conn, allowFallback)
+            return
+
         util.LOG('Updating reachability for {0}: conns={1}, allowFallback={2}', repr(self.name), len(self.connections), allowFallback)
 
         epoch = time.time()
         retrySeconds = 60
         minSeconds = 10
+        candidates = []
         for i in range(len(self.connections)):
             conn = self.connections[i]
             diff = epoch - (conn.lastTestedAt or 0)
@@ -413,29 +687,106 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
             elif (diff < minSeconds or (not self.isSecondary() and self.isReachable() and diff < retrySeconds)) and \
                     not conn.state == "unauthorized":
                 util.DEBUG_LOG("Skip reachability test for {0} (checked {1} secs ago)", conn, diff)
-            elif conn.testReachability(self, allowFallback):
-                self.pendingReachabilityRequests += 1
-                if conn.isSecure:
-                    self.pendingSecureRequests += 1
+            elif util.RACE_CONNECTIONS:
+                candidates.append(conn)
+            else:
+                self.startReachabilityTest(conn, allowFallback)
 
-                if self.pendingReachabilityRequests == 1:
-                    self.trigger("started:reachability")
+        if candidates:
+            if self.race:
+                self.race.stop()
+            self.race = ReachabilityRace(self, candidates, allowFallback)
+            self.race.startNext()
 
         if self.pendingReachabilityRequests <= 0:
             self.trigger("completed:reachability")
 
+    def startReachabilityTest(self, conn, allowFallback=False):
+        if conn.testReachability(self, allowFallback):
+            self.pendingReachabilityRequests += 1
+            if conn.isSecure:
+                self.pendingSecureRequests += 1
+
+            if self.pendingReachabilityRequests == 1:
+                self.trigger("started:reachability")
+            return True
+
+        return False
+
+    def cancelReachabilityTest(self, conn):
+        # a canceled test won't report back (or its late result is ignored), so account for it here
+        conn.raceCanceled = True
+        conn.hasPendingRequest = None
+        conn.cancelReachability()
+        self.pendingReachabilityRequests -= 1
+        if conn.isSecure:
+            self.pendingSecureRequests -= 1
+
+    def restoreConnection(self, lastConnection):
+        """
+        Optimistically use the connection that was active last time, without testing it first. It is verified in the
+        background; only if that or a real query fails, all connections are tested.
+        """
+        for conn in self.connections:
+            if conn.address == lastConnection.get('address') and not conn.isFallback:
+                break
+        else:
+            return False
+
+        root = ElementTree.Element('MediaContainer', lastConnection.get('root') or {})
+        if not self.collectDataFromRoot(root):
+            return False
+
+        conn.state = conn.STATE_REACHABLE
+        conn.rtt = lastConnection.get('rtt')
+        conn.lastTestedAt = lastConnection.get('testedAt')
+        conn.getScore(True)
+        self.activeConnection = self.optimisticConnection = conn
+        self.persistedAddress = conn.address
+        util.LOG("Restored connection for {0}: {1} (rtt: {2} ms, score: {3}, tested {4:.0f} s ago)", repr(self.name),
+                 conn.address, conn.rtt, conn.getScore(), time.time() - (conn.lastTestedAt or 0))
+        return True
+
+    def onOptimisticConnectionFailed(self):
+        conn = self.optimisticConnection
+        if not conn:
+            return
+
+        util.LOG("Query over the restored connection for {0} failed, testing all connections", repr(self.name))
+        self.optimisticConnection = None
+        conn.state = conn.STATE_UNREACHABLE
+        conn.getScore(True)
+        self.updateReachability(True)
+
     def cancelReachability(self):
+        if self.race:
+            self.race.stop()
+
         for i in range(len(self.connections)):
             conn = self.connections[i]
             conn.cancelReachability()
 
     def onReachabilityResult(self, connection):
         connection.lastTestedAt = time.time()
+        if connection.raceCanceled:
+            # we've given up on this test already
+            connection.raceCanceled = False
+            return
+
         connection.hasPendingRequest = None
         self.pendingReachabilityRequests -= 1
         if connection.isSecure:
             self.pendingSecureRequests -= 1
 
+        if self.race:
+            self.race.onResult(connection)
+
+        if connection is self.optimisticConnection:
+            self.optimisticConnection = None
+            if connection.state != connection.STATE_REACHABLE:
+                util.LOG("Restored connection for {0} isn't reachable anymore, testing all connections", repr(self.name))
+                self.updateReachability(True)
+
         util.DEBUG_LOG("Reachability result for {0}: {1} is {2}", repr(self.name), connection.address, connection.state)
 
         # Noneate active connection if the state is unreachable
@@ -458,13 +809,24 @@ class PlexServer(plexresource.PlexResource, signalsmixin.SignalsMixin):
                 best = conn
 
         if best and best.state == best.STATE_REACHABLE:
-            if (best.isSecure or util.LOCAL_OVER_SECURE) or self.pendingSecureRequests <= 0:
+            # when racing, use a good connection right away; a better one replaces it once it answers. an insecure one
+            # has to wait for the secure candidates though
+            securePending = self.pendingSecureRequests > 0 or self.race and self.race.securePending()
+            if best.isSecure or util.LOCAL_OVER_SECURE or not securePending:
                 util.DEBUG_LOG("Using connection for {0} for now: {1}", repr(self.name), best.address)
                 self.activeConnection = best
+                if self.race:
+                    self.race.settle(best)
             else:
                 util.DEBUG_LOG("Found a good connection for {0}, but holding out for better", repr(self.name))
 
         if self.pendingReachabilityRequests <= 0:
+            if self.race:
+                util.DEBUG_LOG("Reachability race for {0} finished after {1:.0f} ms", repr(self.name),
+                               (time.time() - self.race.started) * 1000)
+                self.race.stop()
+                self.race = None
+
             # Retest the server with fallback enabled. hasFallback will only
             # be True if there are available insecure connections and fallback
             # is allowed.
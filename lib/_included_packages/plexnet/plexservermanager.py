@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 import json
+import time
 
 from . import http
 from . import plexconnection
@@ -13,6 +14,10 @@ from . import util
 from six.moves import range
 
 
+# how long a persisted connection may be used optimistically on startup (s)
+CONNECTION_CACHE_MAX_AGE = 7 * 86400
+
+
 class SearchContext(dict):
     def __getattr__(self, attr):
         return self.get(attr)
@@ -253,6 +258,11 @@ class PlexServerManager(signalsmixin.SignalsMixin):
         # See if we should settle for the best we've found so far.
         self.checkSelectedServerSearch()
 
+        # remember the winning connection of the selected server for the next start
+        if reachable and server == self.selectedServer and server.activeConnection and \
+                server.activeConnection.address != server.persistedAddress:
+            self.saveState()
+
     def checkSelectedServerSearch(self, skip_preferred=False, skip_owned=False):
         if self.selectedServer:
             return self.selectedServer
@@ -360,10 +370,20 @@ class PlexServerManager(signalsmixin.SignalsMixin):
                 else:
                     server.connections.append(connection)
 
+            lastConnection = serverObj.get('lastConnection')
+            if lastConnection and time.time() - lastConnection.get('testedAt', 0) < CONNECTION_CACHE_MAX_AGE:
+                server.restoreConnection(lastConnection)
+
             self.serversByUuid[server.uuid] = server
 
         util.LOG("Loaded {0} servers from registry", len(obj['servers']))
         util.APP.trigger("loaded:server_connections", servers=self.serversByUuid.values(), source="stored")
+
+        # select the preferred server right away if we could restore its connection; it's verified in the background
+        preferred = self.serversByUuid.get(self.searchContext.preferredServer)
+        if preferred and preferred.optimisticConnection:
+            self.updateReachabilityResult(preferred, True)
+
         self.updateReachability(False, True)
 
     def saveState(self, setPreferred=False):
@@ -401,6 +421,17 @@ class PlexServerManager(signalsmixin.SignalsMixin):
                         'token': conn.token
                     })
 
+                conn = server.activeConnection
+                if conn and conn.state == conn.STATE_REACHABLE and server.rootAttributes:
+                    serverObj['lastConnection'] = {
+                        'address': conn.address,
+                        'rtt': conn.rtt,
+                        'score': conn.getScore(),
+                        'testedAt': conn.lastTestedAt or time.time(),
+                        'root': server.rootAttributes
+                    }
+                    server.persistedAddress = conn.address
+
                 obj['servers'].append(serverObj)
 
         if self.selectedServer and not self.selectedServer.synced and not self.selectedServer.isSecondary() \
@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+import threading
+from collections import OrderedDict
+
+from . import util
+
+
+class CacheEntry(object):
+    __slots__ = ("etag", "lastModified", "tree", "size")
+
+    def __init__(self, etag, lastModified, tree, size):
+        self.etag = etag
+        self.lastModified = lastModified
+        self.tree = tree
+        self.size = size
+
+    def conditionalHeaders(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.lastModified:
+            headers['If-Modified-Since'] = self.lastModified
+        return headers
+
+
+class ResponseCache(object):
+    """
+    LRU of parsed query responses which carry an ETag or Last-Modified header, bounded by the summed size of their
+    bodies. Entries are always revalidated with the server; a 304 serves the cached tree.
+    """
+    STATS_INTERVAL = 25
+
+    def __init__(self, maxSize=2 * 1024 * 1024):
+        self.maxSize = maxSize
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.changed = 0
+
+    def __repr__(self):
+        lookups = self.hits + self.misses + self.changed or 1
+        return '<ResponseCache entries: {0} size: {1} KB hit: {2:.0%} miss: {3:.0%} revalidate: {4:.0%}>'.format(
+            len(self.entries), self.size // 1024, self.hits / float(lookups), self.misses / float(lookups),
+            (self.hits + self.changed) / float(lookups))
+
+    @staticmethod
+    def key(url):
+        return util.cleanToken(url)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry:
+                self.entries[key] = entry
+            return entry
+
+    def hit(self, entry):
+        self.hits += 1
+        self._logStats()
+        return entry.tree
+
+    def store(self, key, response, tree, size, revalidated=False):
+        if revalidated:
+            self.changed += 1
+        else:
+            self.misses += 1
+        self._logStats()
+
+        etag = response.headers.get('ETag')
+        lastModified = response.headers.get('Last-Modified')
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= old.size
+
+            if not (etag or lastModified) or size > self.maxSize // 4:
+                return
+
+            self.entries[key] = CacheEntry(etag, lastModified, tree, size)
+            self.size += size
+            while self.size > self.maxSize:
+                self.size -= self.entries.popitem(last=False)[1].size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _logStats(self):
+        if not (self.hits + self.misses + self.changed) % self.STATS_INTERVAL:
+            util.DEBUG_LOG("Query cache: {0}", self)
+
+
+CACHE = ResponseCache()
@@ -2,7 +2,13 @@
 # import ctypes
 from __future__ import absolute_import
 import threading
-# import time
+import heapq
+import itertools
+import time
+
+from . import util
+
+monotonic = getattr(time, 'monotonic', time.time)
 
 
 # def _async_raise(tid, exctype):
@@ -92,3 +98,241 @@ class KillableThread(threading.Thread):
     #         self._Thread__target(*self._Thread__args, **self._Thread__kwargs)
     #     except KillThreadException:
     #         self.onKilled()
+
+
+
+class ExecutorJob(object):
+    def __init__(self, func, args=None, kwargs=None, priority=0, deadline=None, onExpired=None):
+        self.func = func
+        self.args = args or ()
+        self.kwargs = kwargs or {}
+        self.priority = priority
+        self.deadline = deadline
+        self.onExpired = onExpired
+        self.canceled = False
+
+    def cancel(self):
+        self.canceled = True
+
+    def isExpired(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+    def run(self):
+        if self.isExpired():
+            if self.onExpired:
+                self.onExpired()
+            return
+
+        self.func(*self.args, **self.kwargs)
+
+
+class PriorityExecutor(object):
+    """
+    Runs jobs on a bounded number of worker threads. Jobs with a lower priority value run first, jobs of equal
+    priority run in submission order. Workers are spawned on demand and exit after idling for idleTimeout seconds.
+    """
+    def __init__(self, name, maxWorkers=8, idleTimeout=30):
+        self.name = name
+        self.maxWorkers = maxWorkers
+        self.idleTimeout = idleTimeout
+        self._cond = threading.Condition()
+        self._queue = []
+        self._counter = itertools.count()
+        self._workers = 0
+        self._idle = 0
+        self._running = 0
+        self._shutdown = False
+
+    def __repr__(self):
+        return '<PriorityExecutor {0} queued: {1} in-flight: {2} workers: {3}/{4}>'.format(
+            self.name, self.queueDepth, self.inFlight, self._workers, self.maxWorkers)
+
+    @property
+    def queueDepth(self):
+        return len(self._queue)
+
+    @property
+    def inFlight(self):
+        return self._running
+
+    def submit(self, func, args=None, kwargs=None, priority=0, deadline=None, onExpired=None):
+        job = ExecutorJob(func, args, kwargs, priority=priority, deadline=deadline, onExpired=onExpired)
+        with self._cond:
+            if self._shutdown:
+                return None
+
+            heapq.heappush(self._queue, (priority, next(self._counter), job))
+            if len(self._queue) > self._idle and self._workers < self.maxWorkers:
+                self._workers += 1
+                KillableThread(target=self._work, name='{0}-WORKER'.format(self.name)).start()
+            self._cond.notify()
+
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                # another worker may have taken the job we were woken for; only retire after idling for idleTimeout
+                idleUntil = monotonic() + self.idleTimeout
+                while not self._queue and not self._shutdown:
+                    remaining = idleUntil - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._idle += 1
+                    self._cond.wait(remaining)
+                    self._idle -= 1
+
+                if self._shutdown or not self._queue:
+                    self._workers -= 1
+                    return
+
+                job = heapq.heappop(self._queue)[2]
+                if job.canceled:
+                    continue
+
+                self._running += 1
+
+            try:
+                job.run()
+            except:
+                util.ERROR()
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def shutdown(self):
+        with self._cond:
+            self._shutdown = True
+            for item in self._queue:
+                item[2].cancel()
+            del self._queue[:]
+            self._cond.notify_all()
+
+
+class TimerScheduler(object):
+    """
+    Runs the callbacks of all util.Timers: one thread sleeps on a heap of deadlines until the next one is due and
+    submits the due timers to a PriorityExecutor. Heap entries carry the generation of their timer; cancelling or
+    resetting a timer bumps it, so its old entry is skipped when it comes up instead of being searched for. The heap is
+    rebuilt once most of it is stale.
+    """
+    MAX_WORKERS = 3
+    IDLE_TIMEOUT = 300
+    COMPACT_MIN = 64
+
+    def __init__(self, name='TIMER'):
+        self.name = name
+        self.executor = PriorityExecutor(name, maxWorkers=self.MAX_WORKERS, idleTimeout=self.IDLE_TIMEOUT)
+        self.lock = threading.Lock()
+        self._cond = threading.Condition(self.lock)
+        self._heap = []
+        self._counter = itertools.count()
+        self._stale = 0
+        self._thread = None
+        self._shutdown = False
+        self.fired = 0
+
+    def __repr__(self):
+        return '<TimerScheduler {0} queued: {1} stale: {2} fired: {3} {4}>'.format(
+            self.name, len(self._heap) - self._stale, self._stale, self.fired, self.executor)
+
+    def schedule(self, timer, generation=None):
+        """
+        (Re)schedules timer to fire in timer.timeout seconds, dropping any earlier schedule. With generation, it's a
+        repeat which is dropped if the timer has been reset or canceled since.
+        """
+        with self.lock:
+            if generation is None:
+                self._invalidate(timer)
+            elif generation != timer.generation:
+                return False
+
+            if self._shutdown:
+                return False
+
+            entry = (monotonic() + timer.timeout, next(self._counter), timer, timer.generation)
+            heapq.heappush(self._heap, entry)
+            timer.queued = True
+            if not self._thread:
+                self._thread = KillableThread(target=self._run, name='{0}-SCHEDULER'.format(self.name))
+                self._thread.daemon = True
+                self._thread.start()
+            elif self._heap[0] is entry:
+                self._cond.notify()
+            return True
+
+    def unschedule(self, timer):
+        """
+        Drops the schedule of timer. Returns False if its callback is running.
+        """
+        with self.lock:
+            self._invalidate(timer)
+            return not timer.running
+
+    def claim(self, timer, generation):
+        """
+        Called by the worker about to run the callback; False if the timer has been reset or canceled meanwhile.
+        """
+        with self.lock:
+            if generation != timer.generation:
+                return False
+            timer.running = True
+            return True
+
+    def release(self, timer, generation, again):
+        """
+        Called by the worker after the callback ran. Reschedules a repeating timer; returns whether the timer is done.
+        """
+        with self.lock:
+            timer.running = False
+            if generation != timer.generation:
+                # canceled or reset while running
+                return timer.isExpired()
+
+        return not (again and self.schedule(timer, generation))
+
+    def shutdown(self):
+        with self.lock:
+            self._shutdown = True
+            del self._heap[:]
+            self._stale = 0
+            self._cond.notify()
+        self.executor.shutdown()
+
+    def _invalidate(self, timer):
+        timer.generation += 1
+        if not timer.queued:
+            return
+
+        timer.queued = False
+        self._stale += 1
+        if self._stale > self.COMPACT_MIN and self._stale * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if entry[3] == entry[2].generation]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _run(self):
+        with self.lock:
+            while not self._shutdown:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                deadline, count, timer, generation = self._heap[0]
+                if generation != timer.generation:
+                    heapq.heappop(self._heap)
+                    self._stale -= 1
+                    continue
+
+                remaining = deadline - monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+
+                heapq.heappop(self._heap)
+                timer.queued = False
+                self.fired += 1
+                self.executor.submit(timer.fire, args=(generation,))
+
+
+SCHEDULER = TimerScheduler()
@@ -61,6 +61,11 @@ PLEXTV_TIMEOUT = None                               # set me later
 PLEXTV_TIMEOUT_READ = 20                                   # s
 PLEXTV_TIMEOUT_CONNECT = 5
 CONN_CHECK_TIMEOUT = 2.5                            # s
+RACE_CONNECTIONS = True                             # test connections best-first and use the first reachable one
+RACE_STAGGER = 0.25                                 # s between starting two connection tests of a race
+QUERY_CACHE = False                                 # revalidate query responses with ETag/Last-Modified
+IDENTITY_MAP = False                                # share metadata objects per server and ratingKey
+METADATA_STORE = False                              # keep hub and section listings in a local database
 LAN_REACHABILITY_TIMEOUT = 0.01                     # s
 CHECK_LOCAL = False
 LOCAL_OVER_SECURE = False
@@ -320,62 +325,87 @@ class CompatEvent(Event):
 
 
 class Timer(object):
+    """
+    Calls function after timeout seconds, or every timeout seconds with repeat. Timers don't have threads of their own;
+    threadutils.SCHEDULER keeps their deadlines and runs the callbacks on a small worker pool, so cancel() and reset()
+    only reschedule and never wait for a thread.
+    """
     def __init__(self, timeout, function, repeat=False, name=None, fname=None, *args, **kwargs):
         self.function = function
         self.timeout = timeout
         self.repeat = repeat
         self.args = args
         self.kwargs = kwargs
-        self._reset = False
         self.name = name or 'TIMER:{0}'.format(self.function)
         self.fname = fname or repr(self.function)
         self.event = CompatEvent()
+        self.finished = CompatEvent()
+        self.generation = 0
+        self.queued = False
+        self.running = False
+        self.thread = None
         self.start()
 
-    def start(self):
+    def start(self, reset=False):
+        from . import threadutils
+
+        DEBUG_LOG('Timer {0}: {1}'.format(self.fname, reset and 'RESET' or 'STARTED'))
         self.event.clear()
-        self.thread = threading.Thread(target=self.run, name=self.name, *self.args, **self.kwargs)
-        self.thread.start()
+        self.finished.clear()
+        if not threadutils.SCHEDULER.schedule(self):
+            self.finish()
+
+    def fire(self, generation):
+        from . import threadutils
 
-    def run(self):
-        DEBUG_LOG('Timer {0}: {1}'.format(self.fname, self._reset and 'RESET'or 'STARTED'))
+        if not threadutils.SCHEDULER.claim(self, generation):
+            return
+
+        again = self.repeat
+        self.thread = threading.current_thread()
         try:
-            while not self.event.isSet() and not self.shouldAbort():
-                while not self.event.wait(self.timeout) and not self.shouldAbort():
-                    if self._reset:
-                        return
-
-                    self.function(*self.args, **self.kwargs)
-                    if not self.repeat:
-                        return
+            if self.shouldAbort():
+                again = False
+            else:
+                self.function(*self.args, **self.kwargs)
+        except Exception:
+            ERROR()
+            again = False
         finally:
-            if not self._reset:
-                if self in APP.timers:
-                    APP.timers.remove(self)
+            self.thread = None
+            if threadutils.SCHEDULER.release(self, generation, again):
+                self.finish()
 
-                DEBUG_LOG('Timer {0}: FINISHED'.format(self.fname))
+    def finish(self):
+        if self.finished.isSet():
+            return
 
-            self._reset = False
+        if self in APP.timers:
+            APP.timers.remove(self)
+
+        DEBUG_LOG('Timer {0}: FINISHED'.format(self.fname))
+        self.finished.set()
 
     def cancel(self):
+        from . import threadutils
+
         self.event.set()
+        if threadutils.SCHEDULER.unschedule(self):
+            self.finish()
 
     def reset(self):
-        self._reset = True
-        self.cancel()
-        if self.thread and self.thread.is_alive():
-            self.thread.join()
-        self.start()
+        self.start(reset=True)
 
     def is_alive(self):
-        return self.thread and self.thread.is_alive()
+        return not self.finished.isSet()
 
     def shouldAbort(self):
         return False
 
     def join(self, timeout=None):
-        if self.thread.is_alive():
-            self.thread.join(timeout=timeout)
+        # a callback canceling its own timer can't wait for itself
+        if self.thread is not threading.current_thread():
+            self.finished.wait(timeout)
 
     def isExpired(self):
         return self.event.isSet()
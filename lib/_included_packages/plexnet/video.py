@@ -495,8 +495,8 @@ class PlayableVideo(Video, media.RelatedMixin):
         self._audioStreams = None
         self._subtitleStreams = None
 
-    def reload(self, *args, **kwargs):
-        if not kwargs.get('_soft'):
+    def prepareReload(self, kwargs, soft=False):
+        if not soft:
             if self.get('viewCount'):
                 del self.viewCount
             if self.get('viewOffset'):
@@ -508,50 +508,54 @@ class PlayableVideo(Video, media.RelatedMixin):
         kwargs["includeMarkers"] = 1
 
         # capture current IDs
-        mediaID = None
-        partID = None
-        streamIDs = None
-        reSelect = False
-        if fromMediaChoice and self.mediaChoice:
-            reSelect = True
-            mediaID = self.mediaChoice.media.id
-            partID = self.mediaChoice.part.id
-            streamIDs = []
-            if self.mediaChoice.media.hasStreams():
-                if forceSubtitlesFromPlex:
-                    subtitleStream = self.selectedSubtitleStream(ref=None, force_from_plex=forceSubtitlesFromPlex)
-                else:
-                    subtitleStream = self.selectedSubtitleStream(fallback=False,
-                                                                 forced_subtitles_override=self.settings.getPreference("forced_subtitles_override", False) and util.ACCOUNT.subtitlesForced == 0,
-                                                                 deselect_subtitles=self.settings.getPreference("disable_subtitle_languages", []))
-                videoStream = self.selectedVideoStream(fallback=True)
-                audioStream = self.selectedAudioStream(fallback=True)
-                streamIDs = []
-                if videoStream:
-                    streamIDs.append(videoStream.id)
-                if audioStream:
-                    streamIDs.append(audioStream.id)
-                if subtitleStream:
-                    streamIDs.append(subtitleStream.id)
-
-        Video.reload(self, *args, **kwargs)
+        if not (fromMediaChoice and self.mediaChoice):
+            return None
+
+        mediaID = self.mediaChoice.media.id
+        partID = self.mediaChoice.part.id
+        streamIDs = []
+        if self.mediaChoice.media.hasStreams():
+            if forceSubtitlesFromPlex:
+                subtitleStream = self.selectedSubtitleStream(ref=None, force_from_plex=forceSubtitlesFromPlex)
+            else:
+                subtitleStream = self.selectedSubtitleStream(fallback=False,
+                                                             forced_subtitles_override=self.settings.getPreference("forced_subtitles_override", False) and util.ACCOUNT.subtitlesForced == 0,
+                                                             deselect_subtitles=self.settings.getPreference("disable_subtitle_languages", []))
+            videoStream = self.selectedVideoStream(fallback=True)
+            audioStream = self.selectedAudioStream(fallback=True)
+            if videoStream:
+                streamIDs.append(videoStream.id)
+            if audioStream:
+                streamIDs.append(audioStream.id)
+            if subtitleStream:
+                streamIDs.append(subtitleStream.id)
+
+        return mediaID, partID, streamIDs
+
+    def finishReload(self, state):
+        if not state:
+            return
 
         # re-select selected IDs
-        if reSelect:
-            selMedia = None
-            selPartIndex = 0
-            for media in self.media:
-                if media.id == mediaID:
-                    selMedia = media
-                    media.set('selected', '1')
-                    for index, part in enumerate(media.parts):
-                        if part.id == partID:
-                            selPartIndex = index
-                            for stream in part.streams:
-                                if stream.id in streamIDs:
-                                    stream.setSelected(True)
-            self.mediaChoice = mediachoice.MediaChoice(selMedia, partIndex=selPartIndex)
+        mediaID, partID, streamIDs = state
+        selMedia = None
+        selPartIndex = 0
+        for media in self.media:
+            if media.id == mediaID:
+                selMedia = media
+                media.set('selected', '1')
+                for index, part in enumerate(media.parts):
+                    if part.id == partID:
+                        selPartIndex = index
+                        for stream in part.streams:
+                            if stream.id in streamIDs:
+                                stream.setSelected(True)
+        self.mediaChoice = mediachoice.MediaChoice(selMedia, partIndex=selPartIndex)
 
+    def reload(self, *args, **kwargs):
+        state = self.prepareReload(kwargs, soft=kwargs.get('_soft'))
+        Video.reload(self, *args, **kwargs)
+        self.finishReload(state)
         return self
 
     def postPlay(self, **params):
@@ -1,23 +1,24 @@
 from __future__ import absolute_import
 import six.moves.queue
-import heapq
+import itertools
 from kodi_six import xbmc
 from . import util
-from plexnet import threadutils
+from plexnet import asyncadapter, threadutils
 from six.moves import range
 
 
 class Tasks(list):
     def add(self, task):
-        for t in self:
-            if not t.isValid():
-                self.remove(t)
+        self.clean()
 
         if isinstance(task, list):
             self += task
         else:
             self.append(task)
 
+    def clean(self):
+        self[:] = [t for t in self if t.isValid()]
+
     def cancel(self):
         while self:
             self.pop().cancel()
@@ -27,10 +28,55 @@ class Tasks(list):
         BGThreader.kill()
 
 
+class TaskScope(Tasks):
+    """
+    The tasks of a window. Canceling the scope cancels its queued tasks, which the workers skip, and aborts the HTTP
+    requests its running tasks have in flight, so the workers are free for whatever comes next right away.
+    """
+    def __init__(self, name):
+        Tasks.__init__(self)
+        self.name = name
+        self.canceled = 0
+
+    def __repr__(self):
+        return '<TaskScope {0} queued: {1} running: {2} canceled: {3}>'.format(self.name, *self.counts())
+
+    def add(self, task):
+        for t in isinstance(task, list) and task or [task]:
+            t._scope = self
+        Tasks.add(self, task)
+
+    def counts(self):
+        """(queued, running, canceled) tasks of this scope"""
+        queued = running = 0
+        for t in list(self):
+            if t.isValid():
+                if t.started:
+                    running += 1
+                else:
+                    queued += 1
+        return queued, running, self.canceled
+
+    def cancel(self):
+        queued, running, canceled = self.counts()
+        tasks = list(self)
+        del self[:]
+        for t in tasks:
+            if t.isValid():
+                t.cancel()
+                self.canceled += 1
+
+        if queued or running:
+            asyncadapter.POOL.cancel(self)
+            util.DEBUG_LOG('BGThreader: {0}: canceled {1} queued and {2} running tasks', self.name, queued, running)
+
+
 class Task:
     def __init__(self, priority=None):
         self._priority = priority
         self._canceled = False
+        self._scope = None
+        self.started = False
         self.finished = False
 
     def __cmp__(self, other):
@@ -49,8 +95,10 @@ class Task:
         BGThreader.addTask(self)
 
     def _run(self):
-        self.run()
-        self.finished = True
+        try:
+            self.run()
+        finally:
+            self.finished = True
 
     def run(self):
         pass
@@ -66,21 +114,110 @@ class Task:
 
 
 class MutablePriorityQueue(six.moves.queue.PriorityQueue):
-    def _get(self, heappop=heapq.heappop):
-        self.queue.sort()
-        return heappop(self.queue)
+    """
+    Indexed binary heap of tasks, ordered by priority and then by the order they were added in. Adding, taking and
+    reprioritizing a queued task are O(log n); canceled tasks are dropped when they come up.
+    """
+    def _init(self, maxsize):
+        self.queue = []  # [priority, sequence, task]
+        self.positions = {}
+        self.counter = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, task):
+        pos = self.positions.get(task)
+        if pos is not None:
+            # already queued; put() counts it as unfinished again
+            self.unfinished_tasks -= 1
+            self._setPriority(pos, task._priority)
+            return
+
+        self.queue.append([task._priority, next(self.counter), task])
+        self.positions[task] = len(self.queue) - 1
+        self._siftUp(len(self.queue) - 1)
+
+    def _get(self):
+        while True:
+            task = self._pop()
+            if not task._canceled or not self.queue:
+                return task
+
+            # nobody will call task_done() for it
+            self.unfinished_tasks -= 1
+            if not self.unfinished_tasks:
+                self.all_tasks_done.notify_all()
+
+    def cancelAll(self):
+        with self.mutex:
+            for entry in self.queue:
+                entry[2].cancel()
 
     def lowest(self):
-        """Return the lowest priority item in the queue (not reliable!)."""
-        self.mutex.acquire()
-        try:
-            lowest = self.queue and min(self.queue) or None
-        except:
-            lowest = None
-            util.ERROR()
-        finally:
-            self.mutex.release()
-        return lowest
+        """Return the lowest priority item in the queue, which may be a canceled one."""
+        with self.mutex:
+            return self.queue[0][2] if self.queue else None
+
+    def reprioritize(self, task, priority):
+        """Change the priority of a queued task; returns False if it isn't queued."""
+        with self.mutex:
+            pos = self.positions.get(task)
+            if pos is None:
+                return False
+
+            task._priority = priority
+            self._setPriority(pos, priority)
+            return True
+
+    def _setPriority(self, pos, priority):
+        previous = self.queue[pos][0]
+        self.queue[pos][0] = priority
+        if priority < previous:
+            self._siftUp(pos)
+        else:
+            self._siftDown(pos)
+
+    def _pop(self):
+        last = self.queue.pop()
+        if self.queue:
+            entry = self.queue[0]
+            self._place(0, last)
+            self._siftDown(0)
+        else:
+            entry = last
+        del self.positions[entry[2]]
+        return entry[2]
+
+    def _place(self, pos, entry):
+        self.queue[pos] = entry
+        self.positions[entry[2]] = pos
+
+    def _siftUp(self, pos):
+        entry = self.queue[pos]
+        while pos:
+            parent = (pos - 1) >> 1
+            if not entry < self.queue[parent]:
+                break
+            self._place(pos, self.queue[parent])
+            pos = parent
+        self._place(pos, entry)
+
+    def _siftDown(self, pos):
+        queue = self.queue
+        entry = queue[pos]
+        size = len(queue)
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                break
+            if child + 1 < size and queue[child + 1] < queue[child]:
+                child += 1
+            if not queue[child] < entry:
+                break
+            self._place(pos, queue[child])
+            pos = child
+        self._place(pos, entry)
 
 
 class BackgroundWorker:
@@ -94,10 +231,17 @@ class BackgroundWorker:
     def _runTask(self, task):
         if task._canceled:
             return
+
+        task.started = True
+        # requests made by the task belong to its scope, so canceling the scope aborts them
+        asyncadapter.setRequestOwner(task._scope, task.isCanceled)
         try:
             task._run()
         except:
-            util.ERROR()
+            if not task.isCanceled():
+                util.ERROR()
+        finally:
+            asyncadapter.setRequestOwner()
 
     def abort(self):
         self._abort = True
@@ -164,6 +308,7 @@ class BackgroundThreader:
         self._abort = True
         for w in self.workers:
             w.abort()
+        self._queue.cancelAll()
         return self
 
     def aborted(self):
@@ -212,7 +357,7 @@ class BackgroundThreader:
 
     def getLowestPrority(self):
         lowest = self._queue.lowest()
-        if not lowest:
+        if lowest is None:
             return None
 
         return lowest._priority
@@ -222,7 +367,7 @@ class BackgroundThreader:
         if lowest is None:
             return
 
-        qitem._priority = lowest - 1
+        self._queue.reprioritize(qitem, lowest - 1)
 
     def kill(self):
         for w in self.workers:
@@ -233,6 +378,7 @@ class ThreaderManager:
     def __init__(self, worker_count=5):
         self.index = 0
         self.abandoned = []
+        self.workerCount = worker_count
         self.threader = BackgroundThreader(str(self.index), worker_count=worker_count)
 
     def __getattr__(self, name):
@@ -243,8 +389,9 @@ class ThreaderManager:
             return
 
         self.index += 1
+        self.abandoned = [a for a in self.abandoned if a.hasTask()]
         self.abandoned.append(self.threader.abort())
-        self.threader = BackgroundThreader(str(self.index))
+        self.threader = BackgroundThreader(str(self.index), worker_count=self.workerCount)
 
     def shutdown(self):
         self.threader.shutdown()
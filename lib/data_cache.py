@@ -3,8 +3,8 @@
 import os
 import json
 import time
-import copy
-import zlib
+import sqlite3
+import threading
 
 from kodi_six import xbmcvfs
 
@@ -14,77 +14,119 @@ from . util import translatePath, ADDON, ERROR, DEBUG_LOG, LOG
 
 
 class DataCacheManager(object):
-    # store arbitrary data in JSON on disk
-    DATA_CACHES_VERSION = 2
-    DATA_CACHES = {
-        "general": {},
-        "cache": {}
-    }
-    DC_LAST_UPDATE = None
-    DC_PATH = os.path.join(translatePath(ADDON.getAddonInfo("profile")), "data_cache.json")
+    # store arbitrary data in SQLite on disk; each entry is written on its own, last access times are batched
+    DATA_CACHES_VERSION = 3
+    DC_PATH = os.path.join(translatePath(ADDON.getAddonInfo("profile")), "data_cache.db")
+    DC_LEGACY_PATH = os.path.join(translatePath(ADDON.getAddonInfo("profile")), "data_cache.json")
     DC_LRU_TIMEOUT = 30
     DC_LRUP_TIMEOUT = 90
-    USE_GZ = False
+    DC_ACCESS_BATCH = 100
 
     def __init__(self):
         self._currentServerUUID = None
+        self._accessed = {}
+        self._lock = threading.RLock()
+        self._db = None
         plexapp.util.APP.on('change:selectedServer', self.setServerUUID)
-        if self.USE_GZ:
-            self.DC_PATH += "z"
-        if xbmcvfs.exists(self.DC_PATH):
+        try:
+            self._db = self.openDB(self.DC_PATH)
+        except sqlite3.DatabaseError:
+            ERROR("Couldn't open data_cache.db, recreating")
             try:
-                f = xbmcvfs.File(self.DC_PATH)
-                d = f.readBytes() if self.USE_GZ else f.read()
-                f.close()
-
-                tdc = json.loads(zlib.decompress(d).decode("utf-8") if self.USE_GZ else d)
-                old_ver = tdc["general"].get("version", 0)
-                if old_ver < self.DATA_CACHES_VERSION:
-                    # this is where we migrate
-                    if old_ver == 1:
-                        tdc = self.DATA_CACHES.copy()
-                    tdc["general"]["version"] = self.DATA_CACHES_VERSION
-                    tdc["general"]["updated"] = time.time()
-                    self.DATA_CACHES = tdc
-                    self.storeDataCache()
-                else:
-                    tdc["general"]["version"] = self.DATA_CACHES_VERSION
-                    self.DATA_CACHES.update(tdc)
-                self.dataCacheCleanup()
-                self.DC_LAST_UPDATE = self.DATA_CACHES["general"]["updated"]
-            except:
-                ERROR("Couldn't read data_cache.json")
-                self.DATA_CACHES["general"]["updated"] = time.time()
-                self.storeDataCache()
+                os.remove(self.DC_PATH)
+                self._db = self.openDB(self.DC_PATH)
+            except (OSError, sqlite3.DatabaseError):
+                ERROR("Couldn't recreate data_cache.db")
+                return
+
+        if xbmcvfs.exists(self.DC_LEGACY_PATH):
+            self.migrateLegacy()
+        self.dataCacheCleanup()
+
+    def openDB(self, path):
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        if db.execute('PRAGMA user_version').fetchone()[0] != self.DATA_CACHES_VERSION:
+            # this is where we migrate
+            with db:
+                db.execute('DROP TABLE IF EXISTS cache')
+                db.execute('CREATE TABLE cache (server TEXT, context TEXT, identifier TEXT, data TEXT, '
+                           'updated REAL, last_access REAL, PRIMARY KEY (server, context, identifier))')
+                db.execute('PRAGMA user_version={0}'.format(self.DATA_CACHES_VERSION))
+        return db
+
+    def migrateLegacy(self):
+        # import the entries of the old JSON data cache, then remove it
+        try:
+            f = xbmcvfs.File(self.DC_LEGACY_PATH)
+            d = f.read()
+            f.close()
+            tdc = json.loads(d)
+            rows = []
+            if tdc["general"].get("version", 0) != 1:
+                for server, contexts in tdc["cache"].items():
+                    for context, identifiers in contexts.items():
+                        for identifier, iddata in identifiers.items():
+                            rows.append((server, context, identifier, json.dumps(iddata["data"]), iddata["updated"],
+                                         iddata["last_access"]))
+            with self._lock, self._db:
+                self._db.executemany('INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?, ?, ?)', rows)
+            LOG("Migrated {} entries from data_cache.json".format(len(rows)))
+        except:
+            ERROR("Couldn't migrate data_cache.json")
+        xbmcvfs.delete(self.DC_LEGACY_PATH)
 
     def deinit(self):
         plexapp.util.APP.off('change:selectedServer', self.setServerUUID)
+        with self._lock:
+            if self._db:
+                self._db.close()
+                self._db = None
 
     def getCacheData(self, context, identifier):
-        ret = self.DATA_CACHES["cache"].get(self._currentServerUUID, {}).get(context, {}).get(identifier, {})
-        if "data" in ret and ret["data"]:
-            # purge old data (> X days last updated)
-            if ret["updated"] < time.time() - self.DC_LRUP_TIMEOUT * 3600 * 24:
-                del self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier]
-                return None
+        key = (self._currentServerUUID or '', context, identifier)
+        with self._lock:
+            if not self._db:
+                return
 
-            self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier]["last_access"] = time.time()
-            return ret["data"]
+            try:
+                row = self._db.execute('SELECT data, updated FROM cache WHERE server=? AND context=? AND '
+                                       'identifier=?', key).fetchone()
+                if not row:
+                    return
+
+                # purge old data (> X days last updated)
+                if row[1] < time.time() - self.DC_LRUP_TIMEOUT * 3600 * 24:
+                    with self._db:
+                        self._db.execute('DELETE FROM cache WHERE server=? AND context=? AND identifier=?', key)
+                    return None
+            except sqlite3.Error:
+                ERROR("Couldn't read data cache")
+                return
+
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.DC_ACCESS_BATCH:
+                self.storeDataCache()
+
+        data = json.loads(row[0])
+        if data:
+            return data
 
     def setCacheData(self, context, identifier, value):
-        if self._currentServerUUID not in self.DATA_CACHES["cache"]:
-            self.DATA_CACHES["cache"][self._currentServerUUID] = {}
-        if context not in self.DATA_CACHES["cache"][self._currentServerUUID]:
-            self.DATA_CACHES["cache"][self._currentServerUUID][context] = {}
-        if identifier not in self.DATA_CACHES["cache"][self._currentServerUUID][context]:
-            self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier] = {}
+        key = (self._currentServerUUID or '', context, identifier)
         t = time.time()
-        self.DATA_CACHES["general"]["updated"] = t
-        self.DATA_CACHES["cache"][self._currentServerUUID][context][identifier] = {
-            "updated": t,
-            "last_access": t,
-            "data": value
-        }
+        with self._lock:
+            if not self._db:
+                return
+
+            self._accessed.pop(key, None)
+            try:
+                with self._db:
+                    self._db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)',
+                                     key + (json.dumps(value), t, t))
+            except sqlite3.Error:
+                ERROR("Couldn't write data cache")
 
     def setServerUUID(self, server=None, **kwargs):
         if not server and not plexapp.SERVERMANAGER.selectedServer:
@@ -92,30 +134,33 @@ class DataCacheManager(object):
         self._currentServerUUID = (server if server is not None else plexapp.SERVERMANAGER.selectedServer).uuid[-8:]
 
     def dataCacheCleanup(self):
-        d = copy.deepcopy(self.DATA_CACHES)
-        t = time.time()
-        for k, contexts in d["cache"].items():
-            for context, identifiers in contexts.items():
-                for identifier, iddata in identifiers.items():
-                    # clean up anything not accessed during the last X days
-                    if iddata["last_access"] < t - self.DC_LRU_TIMEOUT * 3600 * 24:
-                        DEBUG_LOG("Clearing cached data for: {}: {}".format(context, identifier))
-                        del self.DATA_CACHES["cache"][k][context][identifier]
+        # clean up anything not accessed during the last X days
+        with self._lock:
+            if not self._db:
+                return
+
+            try:
+                with self._db:
+                    deleted = self._db.execute('DELETE FROM cache WHERE last_access < ?',
+                                               (time.time() - self.DC_LRU_TIMEOUT * 3600 * 24,)).rowcount
+                if deleted:
+                    DEBUG_LOG("Cleared {} cached data entries".format(deleted))
+            except sqlite3.Error:
+                ERROR("Couldn't clean up data cache")
 
     def storeDataCache(self):
-        lu = self.DATA_CACHES["general"].get("updated")
-        if self.DATA_CACHES and lu and self.DC_LAST_UPDATE != lu:
+        # write the batched last access times
+        with self._lock:
+            if not self._db or not self._accessed:
+                return
+
             try:
-                dcf = xbmcvfs.File(self.DC_PATH, "w")
-                self.dataCacheCleanup()
-                d = json.dumps(self.DATA_CACHES)
-                if self.USE_GZ:
-                    d = zlib.compress(d.encode("utf-8"))
-                dcf.write(d)
-                dcf.close()
-                LOG("Data cache written to: addon_data/script.plexmod/data_cache.json")
-            except:
-                ERROR("Couldn't write data_cache.json")
+                with self._db:
+                    self._db.executemany('UPDATE cache SET last_access=? WHERE server=? AND context=? AND '
+                                         'identifier=?', [(t,) + key for key, t in self._accessed.items()])
+                self._accessed = {}
+            except sqlite3.Error:
+                ERROR("Couldn't write data cache")
 
 
 dcm = DataCacheManager()
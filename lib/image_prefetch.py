@@ -0,0 +1,133 @@
+# coding=utf-8
+
+import threading
+from collections import OrderedDict
+
+from plexnet import http
+
+from .util import addonSettings, DEBUG_LOG
+
+
+class ImagePrefetcher(object):
+    """
+    Requests the thumbnails ahead of the focused position of a list in the background, so the server has transcoded
+    them by the time Kodi loads them. The server transcodes an image before it sends the headers, so each response is
+    closed without reading the body, which Kodi downloads itself. At most MAX_WORKERS requests run at once, each URL is
+    requested once per session, failed ones included, and each update replaces the pending requests of the previous
+    position, so a jump doesn't leave a backlog behind.
+
+    Hit rate: when an item gets focused, its thumbnail counts as a hit if it has been prefetched, as late if the request
+    was still running and as a miss otherwise.
+    """
+    MAX_WORKERS = 2
+    MAX_PENDING = 48
+    SEEN_SIZE = 2000
+    STATS_INTERVAL = 100
+    TIMEOUT = 10.0
+
+    def __init__(self):
+        self.session = http.Session()
+        self.pending = []
+        self.requested = OrderedDict()  # url: done
+        self.shown = OrderedDict()
+        self.cond = threading.Condition()
+        self.workers = []
+        self.active = True
+        self.hits = 0
+        self.late = 0
+        self.misses = 0
+        self.fetched = 0
+        self.failed = 0
+
+    def __repr__(self):
+        shown = self.hits + self.late + self.misses or 1
+        return '<ImagePrefetcher fetched: {0} failed: {1} hit: {2:.0%} late: {3:.0%} miss: {4:.0%}>'.format(
+            self.fetched, self.failed, self.hits / float(shown), self.late / float(shown), self.misses / float(shown))
+
+    def update(self, ahead, current=None):
+        """
+        ahead: thumbnail URLs in the order they'll come into view; current: the URL of the focused item
+        """
+        if not addonSettings.imagePrefetch or not self.active:
+            return
+
+        with self.cond:
+            if current:
+                self._count(current)
+
+            self.pending = [url for url in ahead
+                            if url and url.startswith('http') and url not in self.requested][:self.MAX_PENDING]
+            if not self.pending:
+                return
+
+            if len(self.workers) < self.MAX_WORKERS:
+                worker = threading.Thread(target=self._work, name='image.prefetch.{0}'.format(len(self.workers)))
+                worker.daemon = True
+                self.workers.append(worker)
+                worker.start()
+            self.cond.notify_all()
+
+    def cancel(self):
+        with self.cond:
+            self.pending = []
+
+    def shutdown(self):
+        DEBUG_LOG('Image prefetch: {0}', self)
+        with self.cond:
+            self.active = False
+            self.pending = []
+            self.cond.notify_all()
+        self.session.cancel()
+
+    def _count(self, url):
+        if url in self.shown:
+            return
+
+        self.shown[url] = True
+        if len(self.shown) > self.SEEN_SIZE:
+            self.shown.popitem(last=False)
+
+        done = self.requested.get(url)  # None when it failed
+        if done:
+            self.hits += 1
+        elif done is False:
+            self.late += 1
+        else:
+            self.misses += 1
+
+        if not (self.hits + self.late + self.misses) % self.STATS_INTERVAL:
+            DEBUG_LOG('Image prefetch: {0}', self)
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while self.active and not self.pending:
+                    self.cond.wait()
+
+                if not self.active:
+                    return
+
+                url = self.pending.pop(0)
+                self.requested[url] = False
+                if len(self.requested) > self.SEEN_SIZE:
+                    self.requested.popitem(last=False)
+
+            try:
+                response = self.session.get(url, stream=True, timeout=self.TIMEOUT)
+                ok = 200 <= response.status_code < 300
+                response.close()
+            except Exception:
+                ok = False
+
+            with self.cond:
+                if url not in self.requested:
+                    continue
+
+                self.requested[url] = ok or None
+                if ok:
+                    self.fetched += 1
+                else:
+                    self.failed += 1
+
+
+ipf = ImagePrefetcher()
@@ -23,6 +23,7 @@ from . import player
 from . import backgroundthread
 from . import util
 from .data_cache import dcm
+from .image_prefetch import ipf
 
 BACKGROUND = None
 quitKodi = False
@@ -173,6 +174,7 @@ def _main():
                             util.LOG("Couldn't open home window, exiting")
                             return
                         util.CRON.cancelReceiver(windowutils.HOME)
+                        util.CRON.cancelReceiver(windowutils.HOME.hubsRefresher)
 
                         if not windowutils.HOME.closeOption or windowutils.HOME.closeOption in ("quit", "exit"):
                             if windowutils.HOME.closeOption == "quit":
@@ -223,6 +225,7 @@ def _main():
         util.DEBUG_LOG('Main: SHUTTING DOWN...')
         dcm.storeDataCache()
         dcm.deinit()
+        ipf.shutdown()
         plexapp.util.INTERFACE.playbackManager.deinit()
         player.shutdown()
         plexapp.util.APP.preShutdown()
@@ -0,0 +1,303 @@
+# coding=utf-8
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from plexnet import http
+
+from .util import DEBUG_LOG, ERROR
+
+
+def cacheName(url, suffix=''):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest() + suffix
+
+
+class PhotoCache(object):
+    """
+    Size-bounded LRU of downloaded photos in a folder. index.json keeps the files and their sizes in the order they were
+    last used, so the cache outlives the photo window and is trimmed to MAX_SIZE, least recently used first. Pinned
+    files (the ones shown or about to be) are never evicted.
+    """
+    MAX_SIZE = 128 * 1024 * 1024
+    INDEX = 'index.json'
+
+    def __init__(self, folder, maxSize=None):
+        self.folder = folder
+        self.maxSize = maxSize or self.MAX_SIZE
+        self.entries = OrderedDict()
+        self.size = 0
+        self.pinned = set()
+        self.dirty = False
+        self.lock = threading.RLock()
+        self.load()
+
+    def __repr__(self):
+        return '<PhotoCache files: {0} size: {1:.1f} MB>'.format(len(self.entries), self.size / 1048576.0)
+
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.entries
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def tempPath(self, name):
+        return self.path(name + '.part')
+
+    def load(self):
+        if not os.path.isdir(self.folder):
+            try:
+                os.makedirs(self.folder)
+            except OSError:
+                if not os.path.isdir(self.folder):
+                    ERROR()
+                    return
+
+        try:
+            with open(self.path(self.INDEX)) as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            index = []
+
+        for name, size in index:
+            try:
+                if os.path.getsize(self.path(name)) == size:
+                    self.entries[name] = size
+                    self.size += size
+            except OSError:
+                pass
+
+        # anything the index doesn't know about is left over from an unclean exit
+        for name in os.listdir(self.folder):
+            if name != self.INDEX and name not in self.entries:
+                self._remove(name)
+
+        self.trim()
+
+    def get(self, name):
+        """
+        Returns the path of a cached file and marks it as used, or None.
+        """
+        with self.lock:
+            if name not in self.entries:
+                return None
+
+            self.entries.move_to_end(name)
+            self.dirty = True
+            return self.path(name)
+
+    def add(self, name, tmpPath):
+        """
+        Moves a finished download into the cache.
+        """
+        size = os.path.getsize(tmpPath)
+        os.replace(tmpPath, self.path(name))
+        with self.lock:
+            if name in self.entries:
+                self.size -= self.entries.pop(name)
+            self.entries[name] = size
+            self.size += size
+            self.dirty = True
+            self.trim()
+        self.saveIndex()
+
+    def pin(self, names):
+        with self.lock:
+            self.pinned = set(names)
+
+    def trim(self):
+        with self.lock:
+            for name in list(self.entries):
+                if self.size <= self.maxSize:
+                    break
+
+                if name in self.pinned:
+                    continue
+
+                self.size -= self.entries.pop(name)
+                self._remove(name)
+                self.dirty = True
+
+    def saveIndex(self):
+        with self.lock:
+            if not self.dirty:
+                return
+
+            data = json.dumps(list(self.entries.items()))
+            self.dirty = False
+
+            tmpPath = self.tempPath(self.INDEX)
+            try:
+                with open(tmpPath, 'w') as f:
+                    f.write(data)
+                os.replace(tmpPath, self.path(self.INDEX))
+            except (IOError, OSError):
+                ERROR("Photo cache: couldn't write the index")
+
+    def _remove(self, name):
+        try:
+            os.remove(self.path(name))
+        except OSError:
+            pass
+
+
+class PhotoPrefetcher(object):
+    """
+    Downloads photos into a PhotoCache with up to MAX_WORKERS threads sharing one session. Each update() replaces the
+    wanted downloads, most urgent first; a running download whose file isn't wanted anymore (the play queue jumped
+    elsewhere) is aborted between chunks.
+    """
+    MAX_WORKERS = 3
+    CHUNK_SIZE = 64 * 1024
+    TIMEOUT = 10.0
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.session = http.Session()
+        self.cond = threading.Condition()
+        self.pending = []
+        self.wanted = set()
+        self.running = set()
+        self.failed = set()
+        self.workers = []
+        self.active = True
+        self.fetched = 0
+        self.aborted = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '<PhotoPrefetcher shown: {0} waited for: {1} fetched: {2} aborted: {3} failed: {4} {5}>'.format(
+            self.hits, self.misses, self.fetched, self.aborted, self.errors, self.cache)
+
+    def update(self, downloads):
+        """
+        downloads: (name, url) tuples, most urgent first
+        """
+        with self.cond:
+            if not self.active:
+                return
+
+            self.wanted = set(name for name, url in downloads)
+            self.failed.clear()
+            self.cache.pin(self.wanted)
+            self.pending = [(name, url) for name, url in downloads
+                            if url and name not in self.running and name not in self.cache]
+
+            while len(self.workers) < min(self.MAX_WORKERS, len(self.pending)):
+                worker = threading.Thread(target=self._work, name='photo.prefetch.{0}'.format(len(self.workers)))
+                worker.daemon = True
+                self.workers.append(worker)
+                worker.start()
+            self.cond.notify_all()
+
+    def ready(self, names):
+        return all(name in self.cache for name in names)
+
+    def fetching(self, names):
+        with self.cond:
+            return any(name in self.running or name in dict(self.pending) for name in names)
+
+    def wait(self, names, timeout=TIMEOUT):
+        """
+        Blocks until the files are cached, counting whether they already were. Returns False if one of them failed,
+        isn't wanted anymore or the timeout passed.
+        """
+        end = time.time() + timeout
+        with self.cond:
+            if self.ready(names):
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            while True:
+                if self.ready(names):
+                    return True
+
+                if not self.active or any(name in self.failed or name not in self.wanted for name in names):
+                    return False
+
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(min(remaining, 0.5))
+
+    def shutdown(self):
+        with self.cond:
+            self.active = False
+            self.pending = []
+            self.wanted = set()
+            self.cond.notify_all()
+        self.session.cancel()
+        self.cache.saveIndex()
+        DEBUG_LOG('Photo cache: {0}', self)
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while self.active and not self.pending:
+                    self.cond.wait()
+
+                if not self.active:
+                    return
+
+                name, url = self.pending.pop(0)
+                if name in self.cache:
+                    continue
+                self.running.add(name)
+
+            result = self._download(name, url)
+
+            with self.cond:
+                self.running.discard(name)
+                if result:
+                    self.fetched += 1
+                elif result is None:
+                    self.aborted += 1
+                    if name in self.wanted:
+                        # wanted again while it was being aborted
+                        self.pending.insert(0, (name, url))
+                else:
+                    self.failed.add(name)
+                    self.errors += 1
+                self.cond.notify_all()
+
+    def _download(self, name, url):
+        """
+        Returns True when the file was cached, None when it isn't wanted anymore and False on errors.
+        """
+        tmpPath = self.cache.tempPath(name)
+        try:
+            aborted = False
+            response = self.session.get(url, allow_redirects=True, timeout=self.TIMEOUT, stream=True)
+            try:
+                response.raise_for_status()
+                with open(tmpPath, 'wb') as f:
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        if name not in self.wanted:
+                            aborted = True
+                            break
+                        f.write(chunk)
+            finally:
+                response.close()
+
+            if aborted:
+                DEBUG_LOG('Photo cache: aborted {0}', name)
+                os.remove(tmpPath)
+                return None
+
+            self.cache.add(name, tmpPath)
+            return True
+        except Exception as e:
+            if self.active:
+                ERROR("Couldn't load image: %s" % e)
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+            return False
@@ -13,6 +13,7 @@ from iso639 import languages
 from . import backgroundthread
 from . import kodijsonrpc
 from . import colors
+from .trickplay import tpm
 from .windows import seekdialog, windowutils
 from . import util
 from plexnet import plexplayer
@@ -254,6 +255,8 @@ class SeekPlayerHandler(BasePlayerHandler):
         self.skipPostPlay = False
         self.prePlayWitnessed = False
         self._subtitleStreamOffset = None
+        if bif_url:
+            tpm.load(self.player.playerObject)
         self.getDialog(setup=True)
         self.dialog.setup(self.duration, meta, int(self.baseOffset * 1000), self.bifURL, self.title, self.title2,
                           chapters=self.chapters, keepMarkerDef=seeking == self.SEEK_IN_PROGRESS)
@@ -877,6 +880,7 @@ class SeekPlayerHandler(BasePlayerHandler):
             self.dialog.tick()
 
     def close(self):
+        tpm.clear()
         self.hideOSD(delete=True)
 
     def sessionEnded(self):
@@ -884,6 +888,7 @@ class SeekPlayerHandler(BasePlayerHandler):
         if self.ended:
             return
         self.ended = True
+        tpm.clear()
         util.DEBUG_LOG('Player: Video session ended')
         self.player.trigger('session.ended', session_id=self.sessionID)
         self.hideOSD(delete=True)
@@ -304,6 +304,9 @@ plexapp.util.APP.on('change:manual_port_1', onManualIPChange)
 
 plexapp.util.CHECK_LOCAL = util.getSetting('smart_discover_local')
 plexapp.util.LOCAL_OVER_SECURE = util.getSetting('prefer_local')
+plexapp.util.QUERY_CACHE = util.addonSettings.queryCache
+plexapp.util.IDENTITY_MAP = util.addonSettings.identityMap
+plexapp.util.METADATA_STORE = util.addonSettings.metadataStore
 
 # set requests timeout
 TIMEOUT_READ = float(util.addonSettings.requestsTimeoutRead)
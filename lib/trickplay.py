@@ -0,0 +1,263 @@
+# coding=utf-8
+
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+
+from plexnet import http
+
+from .util import translatePath, addonSettings, DEBUG_LOG, ERROR, LOG
+
+BIF_MAGIC = b'\x89BIF\r\n\x1a\n'
+BIF_HEADER_SIZE = 64
+BIF_END = 0xffffffff
+
+
+class BifError(Exception):
+    pass
+
+
+class BifIndex(object):
+    """
+    A BIF file mapped into memory: a 64 byte header (magic, version, frame count, interval in ms), a table of
+    (timestamp, offset) pairs terminated by 0xffffffff and the JPEG frames. Timestamps are multiples of the interval, so
+    the frame shown at a time is found in O(1).
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            self.file.close()
+            raise BifError('Empty BIF file')
+
+        try:
+            self.parse()
+        except Exception:
+            self.close()
+            raise
+
+    def __repr__(self):
+        return '<BifIndex frames: {0} interval: {1}ms>'.format(self.count, self.interval)
+
+    def parse(self):
+        data = self.data
+        if len(data) < BIF_HEADER_SIZE or data[:8] != BIF_MAGIC:
+            raise BifError('Not a BIF file')
+
+        version, count, interval = struct.unpack_from('<3I', data, 8)
+        if len(data) < BIF_HEADER_SIZE + (count + 1) * 8:
+            raise BifError('Truncated BIF index')
+
+        table = struct.unpack_from('<{0}I'.format((count + 1) * 2), data, BIF_HEADER_SIZE)
+        self.timestamps = table[0::2]
+        self.offsets = table[1::2]
+        if self.timestamps[-1] != BIF_END or self.offsets[-1] > len(data):
+            raise BifError('Truncated BIF frames')
+
+        self.count = count
+        self.interval = interval or 1000
+
+    def frameIndex(self, offset):
+        """
+        The index of the frame shown at offset (ms), or None.
+        """
+        if not self.count:
+            return None
+
+        ts = self.timestamps
+        t = max(offset, 0) // self.interval
+        index = min(int(t), self.count - 1)
+        # the table usually has one frame per interval; step over gaps and duplicates otherwise
+        while index > 0 and ts[index] > t:
+            index -= 1
+        while index < self.count - 1 and ts[index + 1] <= t:
+            index += 1
+        return index
+
+    def frame(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+class TrickPlay(object):
+    """
+    The BIF indexes of the parts of a video, downloaded once in the background. image() serves the preview for a time as
+    a local file, extracted from the mapped index on first use.
+    """
+    CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, key, parts, folder):
+        self.key = key
+        self.parts = parts
+        self.folder = folder
+        self.indexes = {}
+        self.extracted = {}
+        self.closed = False
+        self.lock = threading.Lock()
+        self.session = http.Session()
+
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self.thread = threading.Thread(target=self._load, name='trickplay')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def image(self, offset):
+        """
+        The path of the preview at offset (ms), or None if the index of its part hasn't been loaded.
+        """
+        for pos, (start, duration, url) in enumerate(self.parts):
+            if start <= offset < start + duration:
+                break
+        else:
+            return None
+
+        with self.lock:
+            index = self.indexes.get(pos)
+            if self.closed or not index:
+                return None
+
+            frame = index.frameIndex(offset - start)
+            if frame is None:
+                return None
+
+            path = self.extracted.get((pos, frame))
+            if path:
+                return path
+
+            path = os.path.join(self.folder, '{0}_{1}.jpg'.format(pos, frame))
+            try:
+                with open(path, 'wb') as f:
+                    f.write(index.frame(frame))
+            except (IOError, OSError):
+                ERROR("Trickplay: couldn't write {0}".format(path))
+                return None
+
+            self.extracted[(pos, frame)] = path
+            return path
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for index in self.indexes.values():
+                index.close()
+            self.indexes = {}
+            self.extracted = {}
+        self.session.cancel()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _load(self):
+        for pos, (start, duration, url) in enumerate(self.parts):
+            if self.closed:
+                return
+
+            if not url:
+                continue
+
+            path = os.path.join(self.folder, '{0}.bif'.format(pos))
+            started = time.time()
+            try:
+                self._download(url, path)
+                if self.closed:
+                    return
+
+                index = BifIndex(path)
+            except Exception as e:
+                if not self.closed:
+                    ERROR("Trickplay: couldn't load the index of part {0}: {1}".format(pos, e))
+                continue
+
+            with self.lock:
+                if self.closed:
+                    index.close()
+                    return
+                self.indexes[pos] = index
+            DEBUG_LOG('Trickplay: loaded {0} of part {1} ({2} KB) in {3:.0f}ms', index, pos,
+                      os.path.getsize(path) // 1024, (time.time() - started) * 1000)
+
+    def _download(self, url, path):
+        response = self.session.get(url, stream=True, timeout=http.DEFAULT_TIMEOUT)
+        try:
+            response.raise_for_status()
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(self.CHUNK_SIZE):
+                    if self.closed:
+                        break
+                    f.write(chunk)
+        finally:
+            response.close()
+
+
+class TrickPlayManager(object):
+    """
+    Holds the trickplay data of the video being played; loading another video or ending the session evicts it.
+    """
+    FOLDER = os.path.join(translatePath("special://temp/"), "p4k", "trickplay")
+
+    def __init__(self):
+        self.current = None
+        self.sessions = 0
+        self.lock = threading.Lock()
+
+    def load(self, playerObject):
+        if not addonSettings.trickplay:
+            return
+
+        parts = self.getParts(playerObject)
+        key = tuple(path for start, duration, path in parts)
+        with self.lock:
+            # playback restarts on seeks while transcoding; keep what we have for the same parts
+            if self.current and self.current.key == key:
+                return
+
+            self._clear()
+            if not any(key):
+                return
+
+            if not self.sessions:
+                # left over from an earlier run
+                shutil.rmtree(self.FOLDER, ignore_errors=True)
+            self.sessions += 1
+
+            server = playerObject.item.getServer()
+            try:
+                self.current = TrickPlay(key, [(start, duration, path and server.buildUrl(path, True))
+                                               for start, duration, path in parts],
+                                         os.path.join(self.FOLDER, str(self.sessions)))
+            except OSError:
+                ERROR("Trickplay: couldn't create {0}".format(self.FOLDER))
+
+    def getParts(self, playerObject):
+        # (start offset, duration, index path) of each part, see PlexPlayer.getBifUrl
+        parts = []
+        startOffset = 0
+        for part in playerObject.media.parts:
+            duration = part.duration.asInt()
+            parts.append((startOffset, duration, part.getIndexPath("hd") or part.getIndexPath("sd")))
+            startOffset += duration
+        return parts
+
+    def image(self, offset):
+        current = self.current
+        return current and current.image(offset) or None
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def _clear(self):
+        if self.current:
+            LOG('Trickplay: evicting {0} previews', len(self.current.extracted))
+            self.current.close()
+            self.current = None
+
+
+tpm = TrickPlayManager()
@@ -21,6 +21,7 @@ import struct
 import requests
 
 import plexnet.util
+from plexnet.threadutils import monotonic
 
 from .kodijsonrpc import rpc
 
@@ -170,6 +171,11 @@ class AddonSettings(object):
         ("tickrate", 1.0),
         ("honor_plextv_dnsrebind", True),
         ("honor_plextv_pam", True),
+        ("query_cache", False),
+        ("identity_map", False),
+        ("metadata_store", False),
+        ("image_prefetch", False),
+        ("trickplay", True),
         ("coreelec_resume_seek_wait", 500),
         ("background_resolution_scale_perc", 100),
     )
@@ -493,6 +499,9 @@ CRON = None
 
 
 class CronReceiver():
+    # seconds between ticks; None ticks at the interval of the cron
+    tickInterval = None
+
     def tick(self):
         pass
 
@@ -504,13 +513,25 @@ class CronReceiver():
 
 
 class Cron(threading.Thread):
+    """
+    Calls tick() of its receivers every interval seconds, or every tickInterval seconds of the receiver, and halfHour()
+    and day() when those change. The thread sleeps until the next receiver is due, checking for an abort every second;
+    forceTick() ticks the receivers on the cron's interval right away. tick() may return the seconds until it wants to
+    be ticked next.
+    """
+    # wake up at least this often; Kodi doesn't notify us of an abort, and the half hours are taken from the wall clock
+    MAX_WAIT = 1
+
     def __init__(self, interval):
         threading.Thread.__init__(self, name='CRON')
         self.stopped = threading.Event()
-        self.force = threading.Event()
+        self.cond = threading.Condition()
+        self.forced = False
         self.interval = interval
+        self.wakeups = 0
         self._lastHalfHour = self._getHalfHour()
         self._receivers = []
+        self._schedule = {}  # id(receiver): [interval, next tick]
 
         global CRON
 
@@ -526,40 +547,63 @@ class Cron(threading.Thread):
         self.join()
 
     def _wait(self):
-        ct = 0
-        while ct < self.interval:
-            xbmc.sleep(100)
-            ct += 0.1
-            if self.force.isSet():
-                self.force.clear()
-                return True
-            if MONITOR.abortRequested() or self.stopped.isSet():
-                return False
-        return True
+        """
+        Returns the receivers due for a tick, or None once stopped.
+        """
+        with self.cond:
+            while not self.stopped.isSet() and not MONITOR.abortRequested():
+                now = monotonic()
+                due = []
+                for r in self._receivers:
+                    entry = self._schedule[id(r)]
+                    if entry[1] <= now or self.forced and entry[0] is None:
+                        entry[1] = now + (entry[0] or self.interval)
+                        due.append(r)
+                self.forced = False
+
+                if due or self._getHalfHour() != self._lastHalfHour:
+                    self.wakeups += 1
+                    return due
+
+                toHalfHour = 1800 - timeInDayLocalSeconds() % 1800
+                nextTick = min([entry[1] for entry in self._schedule.values()] + [now + self.MAX_WAIT])
+                self.cond.wait(min(nextTick - now, toHalfHour))
 
     def forceTick(self):
-        self.force.set()
+        with self.cond:
+            self.forced = True
+            self.cond.notify()
 
     def stop(self):
         self.stopped.set()
+        with self.cond:
+            self.cond.notify()
 
     def run(self):
-        while self._wait():
-            self._tick()
-        DEBUG_LOG('Cron stopped')
+        while True:
+            due = self._wait()
+            if due is None:
+                break
+            self._tick(due)
+        DEBUG_LOG('Cron stopped after {0} wakeups'.format(self.wakeups))
 
     def _getHalfHour(self):
         tid = timeInDayLocalSeconds() / 60
         return tid - (tid % 30)
 
-    def _tick(self):
+    def _tick(self, due):
         receivers = list(self._receivers)
         receivers = self._halfHour(receivers)
         for r in receivers:
+            if r not in due:
+                continue
             try:
-                r.tick()
+                delay = r.tick()
             except:
                 ERROR()
+                continue
+            if delay is not None:
+                self.reschedule(r, delay)
 
     def _halfHour(self, receivers):
         hh = self._getHalfHour()
@@ -592,15 +636,33 @@ class Cron(threading.Thread):
                 ERROR()
         return ret
 
-    def registerReceiver(self, receiver):
-        if receiver not in self._receivers:
-            DEBUG_LOG('Cron: Receiver added: {0}'.format(receiver))
-            self._receivers.append(receiver)
+    def registerReceiver(self, receiver, interval=None):
+        with self.cond:
+            if receiver not in self._receivers:
+                DEBUG_LOG('Cron: Receiver added: {0}'.format(receiver))
+                interval = interval or receiver.tickInterval
+                self._receivers.append(receiver)
+                self._schedule[id(receiver)] = [interval, monotonic() + (interval or self.interval)]
+                self.cond.notify()
+
+    def reschedule(self, receiver, delay=None):
+        """
+        Ticks receiver in delay seconds instead of at its next interval, or a full interval from now.
+        """
+        with self.cond:
+            entry = self._schedule.get(id(receiver))
+            if entry is None:
+                return
+
+            entry[1] = monotonic() + ((entry[0] or self.interval) if delay is None else max(delay, 0))
+            self.cond.notify()
 
     def cancelReceiver(self, receiver):
-        if receiver in self._receivers:
-            DEBUG_LOG('Cron: Receiver canceled: {0}'.format(receiver))
-            self._receivers.pop(self._receivers.index(receiver))
+        with self.cond:
+            if receiver in self._receivers:
+                DEBUG_LOG('Cron: Receiver canceled: {0}'.format(receiver))
+                self._receivers.pop(self._receivers.index(receiver))
+                self._schedule.pop(id(receiver), None)
 
 
 def getTimeFormat():
@@ -7,7 +7,7 @@ from kodi_six import xbmc
 from kodi_six import xbmcgui
 from collections import OrderedDict
 
-from plexnet import plexapp, playlist, plexplayer, util as pnUtil
+from plexnet import plexapp, playlist, plexplayer, plexobjects, util as pnUtil
 
 from lib import backgroundthread
 from lib import metadata
@@ -32,10 +32,10 @@ VIDEO_RELOAD_KW = dict(includeExtras=1, includeExtrasCount=10, includeChapters=1
 
 
 class EpisodeReloadTask(backgroundthread.Task):
-    def setup(self, episode, callback, with_progress=False, set_item_info=False):
-        self.episode = episode
+    def setup(self, episodes, callback, with_progress=None, set_item_info=False):
+        self.episodes = episodes
         self.callback = callback
-        self.withProgress = with_progress
+        self.withProgress = with_progress or {}
         self.setItemInfo = set_item_info
         return self
 
@@ -48,10 +48,13 @@ class EpisodeReloadTask(backgroundthread.Task):
             return
 
         try:
-            self.episode.reload(checkFiles=1, includeChapters=1, fromMediaChoice=self.episode.mediaChoice is not None)
-            if self.isCanceled():
-                return
-            self.callback(self, self.episode, with_progress=self.withProgress, set_item_info=self.setItemInfo)
+            # fromMediaChoice only re-selects streams for episodes that have a mediaChoice already
+            plexobjects.reloadItems(self.episodes, checkFiles=1, includeChapters=1, fromMediaChoice=True)
+            for episode in self.episodes:
+                if self.isCanceled():
+                    return
+                self.callback(self, episode, with_progress=self.withProgress.get(episode.ratingKey, False),
+                              set_item_info=self.setItemInfo)
         except requests.exceptions.RequestException:
             raise util.NoDataException
         except:
@@ -240,7 +243,7 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
         self.reset(kwargs.get('episode'), kwargs.get('season'), kwargs.get('show'))
         self.parentList = kwargs.get('parentList')
         self.cameFrom = kwargs.get('came_from')
-        self.tasks = backgroundthread.Tasks()
+        self.tasks = backgroundthread.TaskScope('episodes')
 
     def reset(self, episode, season=None, show=None):
         self.episode = episode
@@ -274,9 +277,7 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
         self.episodesPaginator = None
         self.relatedPaginator = None
         kodigui.ControlledWindow.doClose(self)
-        if self.tasks:
-            self.tasks.cancel()
-            self.tasks = None
+        self.tasks.cancel()
         try:
             player.PLAYER.off('new.video', self.onNewVideo)
             player.PLAYER.off('video.progress', self.onVideoProgress)
@@ -330,8 +331,6 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
     def onReInit(self):
         self.playBtnClicked = False
         self.useBGM = False
-        if not self.tasks:
-            self.tasks = backgroundthread.Tasks()
 
         vp = VIDEO_PROGRESS.get(self.show_.ratingKey, {}).get(self.season.ratingKey, {})
 
@@ -1413,7 +1412,8 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
         self.reloadItems(items, with_progress=True)
 
     def reloadItems(self, items, with_progress=False, skip_progress_for=None, set_item_info=False):
-        tasks = []
+        episodes = []
+        withProgress = {}
         for mli in items:
             if not mli.dataSource:
                 continue
@@ -1422,8 +1422,14 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
             if skip_progress_for:
                 item_progress = False if mli.dataSource.ratingKey in skip_progress_for else with_progress
 
-            task = EpisodeReloadTask().setup(mli.dataSource, self.reloadItemCallback, with_progress=item_progress,
-                                             set_item_info=set_item_info)
+            episodes.append(mli.dataSource)
+            withProgress[mli.dataSource.ratingKey] = item_progress
+
+        # reload the episodes in batches instead of one request per episode
+        tasks = []
+        for i in range(0, len(episodes), plexobjects.BATCH_RELOAD_SIZE):
+            task = EpisodeReloadTask().setup(episodes[i:i + plexobjects.BATCH_RELOAD_SIZE], self.reloadItemCallback,
+                                             with_progress=withProgress, set_item_info=set_item_info)
             self.tasks.add(task)
             tasks.append(task)
 
@@ -1433,7 +1439,9 @@ class EpisodesWindow(kodigui.ControlledWindow, windowutils.UtilMixin, SeasonsMix
         return (base and base or self.PLAY_BUTTON_ID) + (mli.getProperty('media.multiple') and 1000 or 0)
 
     def reloadItemCallback(self, task, episode, with_progress=False, set_item_info=False):
-        self.tasks.remove(task)
+        # batched tasks call back once per episode; the task is done with its last one
+        if episode is task.episodes[-1] and task in self.tasks:
+            self.tasks.remove(task)
         del task
 
         if self.closing:
@@ -14,6 +14,7 @@ from six.moves import range
 from lib import backgroundthread
 from lib import player
 from lib import util
+from lib.image_prefetch import ipf
 from lib.path_mapping import pmm
 from lib.plex_hosts import pdm
 from lib.util import T
@@ -29,6 +30,7 @@ from . import background
 from .mixins import SpoilersMixin
 
 HUBS_REFRESH_INTERVAL = 300  # 5 Minutes
+HUBS_REFRESH_RETRY = 5
 HUB_PAGE_SIZE = 10
 
 MOVE_SET = frozenset(
@@ -55,6 +57,17 @@ class HubsList(list):
         return self
 
 
+class HubsRefresher(util.CronReceiver):
+    # ticked by the cron when the hubs of the current section go stale
+    tickInterval = HUBS_REFRESH_INTERVAL
+
+    def __init__(self, window):
+        self.window = window
+
+    def tick(self):
+        return self.window.refreshStaleHubs()
+
+
 class SectionHubsTask(backgroundthread.Task):
     def setup(self, section, callback, section_keys=None, ignore_hubs=None, reselect_pos_dict=None):
         self.section = section
@@ -92,6 +105,36 @@ class SectionHubsTask(backgroundthread.Task):
             self.callback(self.section, hubs)
 
 
+def sectionsSignature(sections, playlists):
+    return bool(playlists), [(s.key, s.title, s.type) for s in sections or ()]
+
+
+class SectionListTask(backgroundthread.Task):
+    """
+    Revalidates a section list drawn from the metadata store; calls back if the library sections or the presence of
+    playlists have changed.
+    """
+    def setup(self, server, signature, callback):
+        self.server = server
+        self.signature = signature
+        self.callback = callback
+        return self
+
+    def run(self):
+        if self.isCanceled() or plexapp.SERVERMANAGER.selectedServer != self.server:
+            return
+
+        try:
+            signature = sectionsSignature(self.server.library.sections(), self.server.playlists())
+        except:
+            util.DEBUG_LOG('Couldn\'t revalidate the library sections of: {0}', self.server)
+            return
+
+        if self.isCanceled() or signature == self.signature:
+            return
+        self.callback()
+
+
 class UpdateHubTask(backgroundthread.Task):
     def setup(self, hub, callback, reselect_pos=None):
         self.hub = hub
@@ -394,7 +437,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         kodigui.BaseWindow.__init__(self, *args, **kwargs)
         SpoilersMixin.__init__(self, *args, **kwargs)
         self.lastSection = home_section
-        self.tasks = []
+        self.tasks = backgroundthread.TaskScope('home')
         self.closeOption = None
         self.hubControls = None
         self.backgroundSet = False
@@ -417,6 +460,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         self._anyItemAction = False
         self._odHubsDirty = False
         self._updateSourceChanged = False
+        self.hubsRefresher = HubsRefresher(self)
         self.librarySettings = None
         self.hubSettings = None
         self.anyLibraryHidden = False
@@ -484,6 +528,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
 
         self.hookSignals()
         util.CRON.registerReceiver(self)
+        util.CRON.registerReceiver(self.hubsRefresher)
         self.updateProperties()
         self.checkPlexDirectHosts(plexapp.SERVERMANAGER.serversByUuid.values(), source="stored")
 
@@ -774,18 +819,37 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
             util.setGlobalProperty('update_source_changed', self._updateSourceChanged, wait=True)
             self._updateSourceChanged = False
 
-        if not self.lastSection or self._ignoreTick:
-            return
+    def hubsStaleIn(self):
+        """
+        Seconds until the hubs of the current section go stale, or None without hubs.
+        """
+        if not self.lastSection:
+            return None
 
         hubs = self.sectionHubs.get(self.lastSection.key)
         if hubs is None:
-            return
+            return None
+
+        return max(hubs.lastUpdated + HUBS_REFRESH_INTERVAL - time.time(), 0)
+
+    def scheduleHubsRefresh(self):
+        util.CRON.reschedule(self.hubsRefresher, self.hubsStaleIn())
+
+    def refreshStaleHubs(self):
+        if self._ignoreTick:
+            return None
+
+        staleIn = self.hubsStaleIn()
+        if staleIn != 0:
+            return staleIn
 
-        if (self.is_active and time.time() - hubs.lastUpdated > HUBS_REFRESH_INTERVAL and
-                not xbmc.Player().isPlayingVideo()):
-            self.showHubs(self.lastSection, update=True)
+        if not self.is_active or xbmc.Player().isPlayingVideo():
+            return HUBS_REFRESH_RETRY
+
+        self.showHubs(self.lastSection, update=True)
 
     def doClose(self):
+        self.tasks.cancel()
         plexapp.util.APP.trigger('close.windows')
         #if self.sectionChangeThread and self.sectionChangeThread.isAlive():
         #    self.sectionChangeThread.join(timeout=2.0)
@@ -1098,7 +1162,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
             tasks = [UpdateHubTask().setup(hub, self.updateHubCallback,
                                            reselect_pos=rp.get(hub.getCleanHubIdentifier(self.lastSection.key is None)))
                      for hub in self.updateHubs.values()]
-        self.tasks += tasks
+        self.tasks.add(tasks)
         backgroundthread.BGThreader.addTasks(tasks)
 
     def showBusy(self, on=True):
@@ -1128,6 +1192,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
     def enableUpdates(self, *args, **kwargs):
         util.LOG("Wake event, resuming updates")
         self._ignoreTick = False
+        self.scheduleHubsRefresh()
 
     def refreshLastSection(self, *args, **kwargs):
         self.enableUpdates()
@@ -1169,10 +1234,8 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
 
     @busy.dialog()
     def serverRefresh(self, section=None):
+        self.tasks.cancel()
         backgroundthread.BGThreader.reset()
-        if self.tasks:
-            for task in self.tasks:
-                task.cancel()
 
         with self.lock:
             self.setProperty('hub.focus', '')
@@ -1665,6 +1728,9 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         if action:
             self._anyItemAction = True
 
+        if is_valid_mli:
+            self.prefetchHubImages(controlID, control, mli)
+
         if action in (xbmcgui.ACTION_NAV_BACK, xbmcgui.ACTION_PREVIOUS_MENU):
             pos = control.getSelectedPos()
             if pos is not None and pos > 0:
@@ -1702,7 +1768,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
                                                      canceledCallback=lambda hub: mli.setBoolProperty('is.updating',
                                                                                                       False),
                                                      reselect_pos=(None, -1))
-                        self.tasks.append(task)
+                        self.tasks.add(task)
                         backgroundthread.BGThreader.addTask(task)
                     return
                 self._lastSelectedItem = (controlID, mlipos)
@@ -1712,9 +1778,19 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         self.cleanTasks()
         task = ExtendHubTask().setup(control.dataSource, self.extendHubCallback,
                                      canceledCallback=lambda hub: mli.setBoolProperty('is.updating', False))
-        self.tasks.append(task)
+        self.tasks.add(task)
         backgroundthread.BGThreader.addTask(task)
 
+    def prefetchHubImages(self, controlID, control, mli):
+        # the rest of the focused hub, then the start of the next hubs down
+        pos = control.getManagedItemPosition(mli)
+        ahead = [item.thumbnailImage for item in control.items[pos + 1:]]
+        index = controlID - 400
+        if index in self.hubFocusIndexes:
+            for nextIndex in self.hubFocusIndexes[self.hubFocusIndexes.index(index) + 1:][:2]:
+                ahead += [item.thumbnailImage for item in self.hubControls[nextIndex].items[:6]]
+        ipf.update(ahead, mli.thumbnailImage)
+
     def displayServerAndUser(self, **kwargs):
         title = plexapp.ACCOUNT.title or plexapp.ACCOUNT.username or ' '
         self.setProperty('user.name', title)
@@ -1737,7 +1813,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
             self.setProperty('server.iconmod2', '')
 
     def cleanTasks(self):
-        self.tasks = [t for t in self.tasks if t]
+        self.tasks.clean()
 
     def sectionChanged(self, force=False):
         self.sectionChangeTimeout = time.time() + 0.5
@@ -1783,6 +1859,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
             util.DEBUG_LOG('Section changed ({0}): {1}', section.key, repr(section.title))
             self.lastSection = section
             self.showHubs(section)
+            self.scheduleHubsRefresh()
 
         # timing issue
         cur_sel_ds = self.sectionList.getSelectedItem().dataSource
@@ -1836,19 +1913,30 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         items.append(homemli)
 
         sections = []
+        server = plexapp.SERVERMANAGER.selectedServer
+
+        # draw the last known sections if we have them and check them in the background
+        _sections = server.storedSections() if plexapp.util.METADATA_STORE else None
+        cached = _sections is not None
+        if cached:
+            task = SectionListTask().setup(server, sectionsSignature(_sections, server.playlists(cached=True)),
+                                           self.sectionListChanged)
+            self.tasks.add(task)
+            backgroundthread.BGThreader.addTask(task)
 
         if "playlists" not in self.librarySettings \
                 or ("playlists" in self.librarySettings and self.librarySettings["playlists"].get("show", True)):
-            pl = plexapp.SERVERMANAGER.selectedServer.playlists()
+            pl = server.playlists(cached=cached)
             if pl:
                 sections.append(playlists_section)
 
-        try:
-            _sections = plexapp.SERVERMANAGER.selectedServer.library.sections()
-        except plexnet.exceptions.BadRequest:
-            self.setFocusId(self.SERVER_BUTTON_ID)
-            util.messageDialog("Error", "Bad request")
-            return
+        if not cached:
+            try:
+                _sections = server.library.sections()
+            except plexnet.exceptions.BadRequest:
+                self.setFocusId(self.SERVER_BUTTON_ID)
+                util.messageDialog("Error", "Bad request")
+                return
 
         self.wantedSections = []
         for section in _sections:
@@ -1868,9 +1956,10 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
             self.wantedSections = None
 
         if plexapp.SERVERMANAGER.selectedServer.hasHubs():
-            self.tasks = [SectionHubsTask().setup(s, self.sectionHubsCallback, self.wantedSections, self.ignoredHubs)
-                          for s in [home_section] + sections]
-            backgroundthread.BGThreader.addTasks(self.tasks)
+            tasks = [SectionHubsTask().setup(s, self.sectionHubsCallback, self.wantedSections, self.ignoredHubs)
+                     for s in [home_section] + sections]
+            self.tasks.add(tasks)
+            backgroundthread.BGThreader.addTasks(tasks)
 
         show_pm_indicator = util.getSetting('path_mapping_indicators')
         for section in sections:
@@ -1903,6 +1992,29 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         else:
             self.setFocusId(self.SECTION_LIST_ID)
 
+    def sectionListChanged(self):
+        util.DEBUG_LOG('Library sections have changed, redrawing')
+        with self.lock:
+            self.fullyRefreshHome(section=self.lastSection)
+
+    def storedHubs(self, section):
+        if not plexapp.util.METADATA_STORE:
+            return None
+
+        try:
+            hubs = plexapp.SERVERMANAGER.selectedServer.hubs(section.key, count=HUB_PAGE_SIZE,
+                                                             section_ids=self.wantedSections,
+                                                             ignore_hubs=self.ignoredHubs, cached=True)
+        except:
+            util.ERROR()
+            return None
+
+        if hubs is None:
+            return None
+
+        util.DEBUG_LOG('Using stored hubs for section: {0}', section.key)
+        return HubsList(hubs).init()
+
     def showHubs(self, section=None, update=False, force=False, reselect_pos_dict=None):
         self.setBoolProperty('no.content', False)
         if not update:
@@ -1967,15 +2079,23 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
                         backgroundthread.BGThreader.moveToFront(task)
                         break
 
-                if section.type != "home":
-                    self.showBusy(False)
-                    self.setBoolProperty('no.content', True)
-                return
+                # while they're being fetched, show the last known hubs of the section if we have them
+                if hubs is None:
+                    hubs = self.storedHubs(section)
+
+                if not hubs:
+                    if section.type != "home":
+                        self.showBusy(False)
+                        self.setBoolProperty('no.content', True)
+                    return
+
+                self.sectionHubs[section.key] = hubs
 
         if section_stale or force:
             util.DEBUG_LOG('Section is stale: {0} REFRESHING - update: {1}, failed before: {2}'.format(
                 "Home" if section.key is None else section.key, update, "Unknown" if not hubs else hubs.invalid))
             hubs.lastUpdated = time.time()
+            self.scheduleHubsRefresh()
             self.cleanTasks()
 
             rpd = self.getCurrentHubsPositions(section)
@@ -1986,7 +2106,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
             task = SectionHubsTask().setup(section, self.sectionHubsCallback, self.wantedSections,
                                            reselect_pos_dict=rpd,
                                            ignore_hubs=self.ignoredHubs)
-            self.tasks.append(task)
+            self.tasks.add(task)
             backgroundthread.BGThreader.addTask(task)
             return
 
@@ -2339,7 +2459,7 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
                     task = ExtendHubTask().setup(control.dataSource, self.extendHubCallback,
                                                  canceledCallback=lambda h: mli.setBoolProperty('is.updating', False),
                                                  size=size, reselect_pos=reselect_pos)
-                    self.tasks.append(task)
+                    self.tasks.add(task)
                     backgroundthread.BGThreader.addTask(task)
                 else:
                     control.selectItem(control.size() - 1)
@@ -2558,6 +2678,4 @@ class HomeWindow(kodigui.BaseWindow, util.CronReceiver, SpoilersMixin):
         self.processCommand(opener.handleOpen(musicplayer.MusicPlayerWindow))
 
     def finished(self):
-        if self.tasks:
-            for task in self.tasks:
-                task.cancel()
+        self.tasks.cancel()
@@ -4,6 +4,7 @@ import json
 import os
 import random
 import threading
+import time
 
 import plexnet
 import six
@@ -12,13 +13,16 @@ import six.moves.urllib.parse
 import six.moves.urllib.request
 from kodi_six import xbmc
 from kodi_six import xbmcgui
+from plexnet import metadatastore
 from plexnet import playqueue
+from plexnet import plexapp
 from plexnet import plexobjects
 from six.moves import range
 
 from lib import backgroundthread
 from lib import player
 from lib import util
+from lib.image_prefetch import ipf
 from lib.util import T
 from . import busy
 from . import dropdown
@@ -194,8 +198,19 @@ def getQueryItemType(section, fallback_to_section_type=False, force_include_coll
         type_ = "{},{}".format(type_, 18)
     return type_
 
+
+def isSameRevision(mli, obj):
+    """ Whether mli already shows this revision of obj, watched state included. """
+    ds = mli.dataSource
+    if not ds or not obj or not hasattr(ds, 'get'):
+        return False
+
+    return all(ds.get(attr) == obj.get(attr)
+               for attr in ('ratingKey', 'updatedAt', 'viewCount', 'viewOffset', 'viewedLeafCount'))
+
+
 class CreateDefaultItemsTask(backgroundthread.Task):
-    def setup(self, startPos, count, totalSize, fallback, callback, key=None):
+    def setup(self, startPos, count, totalSize, fallback, callback, key=None, snapshot=None):
         self.startPos = startPos
         self.count = count
         self.totalSize = totalSize
@@ -205,6 +220,7 @@ class CreateDefaultItemsTask(backgroundthread.Task):
         self.fallback = fallback
         self.callback = callback
         self.key = key
+        self.snapshot = snapshot
         return self
 
     def contains(self, pos):
@@ -217,7 +233,12 @@ class CreateDefaultItemsTask(backgroundthread.Task):
         items = []
         firstMli = None
         for x in range(self.startPos, self.endPos):
-            mli = kodigui.ManagedListItem('')
+            # draw the item as it was the last time if we know it
+            entry = self.snapshot and self.snapshot.entry(x)
+            if entry:
+                mli = kodigui.ManagedListItem(entry[0], thumbnailImage=entry[1])
+            else:
+                mli = kodigui.ManagedListItem('')
             mli.setProperty('thumb.fallback', self.fallback)
             mli.setProperty('index', str(x))
             if self.key:
@@ -227,8 +248,38 @@ class CreateDefaultItemsTask(backgroundthread.Task):
             items.append(mli)
         self.callback(items, self.key, firstMli)
 
+
+class ChunkSizer(object):
+    """
+    Adapts the size of the library chunk requests to the connection: the first chunk is a single unit for a quick first
+    screen, the size doubles (up to maxSize) while chunks arrive within targetTime and halves when they take more than
+    twice as long. Sizes are always multiples of unit.
+    """
+    def __init__(self, unit, maxSize, targetTime=1.0):
+        self.unit = unit
+        self.maxSize = max(unit, maxSize // unit * unit)
+        self.targetTime = targetTime
+        self.size = unit
+
+    def record(self, items, elapsed):
+        if elapsed < self.targetTime:
+            size = self.size * 2
+        elif elapsed > self.targetTime * 2:
+            size = self.size // 2
+        else:
+            size = self.size
+
+        self.size = min(self.maxSize, max(self.unit, size // self.unit * self.unit))
+        util.DEBUG_LOG('Library chunk: {0} items in {1:.0f} ms ({2:.0f} items/s), next chunk size: {3}',
+                       items, elapsed * 1000, items / max(elapsed, 0.001), self.size)
+
+
 class ChunkRequestTask(backgroundthread.Task):
-    def setup(self, section, start, size, callback, filter_=None, sort=None, unwatched=False, subDir=False):
+    # hand streamed items to the window in batches of this size while the chunk is still downloading
+    STREAM_BATCH_SIZE = 30
+
+    def setup(self, section, start, size, callback, filter_=None, sort=None, unwatched=False, subDir=False,
+              sizer=None):
         self.section = section
         self.start = start
         self.size = size
@@ -237,6 +288,9 @@ class ChunkRequestTask(backgroundthread.Task):
         self.sort = sort
         self.unwatched = unwatched
         self.subDir = subDir
+        self.sizer = sizer
+        self.delivered = 0
+        self.pending = []
         return self
 
     def contains(self, pos):
@@ -249,17 +303,132 @@ class ChunkRequestTask(backgroundthread.Task):
         try:
             type_ = getQueryItemType(self.section)
 
+            start = time.time()
             if ITEM_TYPE == 'folder':
-                items = self.section.folder(self.start, self.size, self.subDir)
+                items = self.section.folder(self.start, self.size, self.subDir, callback=self.onItem)
             else:
-                items = self.section.all(self.start, self.size, self.filter, self.sort, self.unwatched, type_=type_)
+                items = self.section.all(self.start, self.size, self.filter, self.sort, self.unwatched, type_=type_,
+                                         callback=self.onItem)
+
+            if self.sizer and items:
+                self.sizer.record(len(items), time.time() - start)
 
             if self.isCanceled():
                 return
-            self.callback(items, self.start)
+            # whatever hasn't been handed over while streaming
+            self.callback(items[self.delivered:], self.start + self.delivered, final=True)
         except plexnet.exceptions.BadRequest:
             util.DEBUG_LOG('404 on section: {0}', repr(self.section.title))
 
+    def onItem(self, item):
+        self.pending.append(item)
+        if len(self.pending) < self.STREAM_BATCH_SIZE or self.isCanceled():
+            return
+
+        items, self.pending = self.pending, []
+        self.callback(items, self.start + self.delivered, final=False)
+        self.delivered += len(items)
+
+
+class LayoutRevalidateTask(backgroundthread.Task):
+    def setup(self, snapshot, fetch, layout, callback):
+        self.snapshot = snapshot
+        self.fetch = fetch
+        self.layout = layout
+        self.callback = callback
+        return self
+
+    def run(self):
+        if self.isCanceled():
+            return
+
+        try:
+            layout = self.fetch()
+        except plexnet.exceptions.BadRequest:
+            util.DEBUG_LOG('404 when revalidating library layout')
+            return
+
+        if self.isCanceled() or layout is None or layout == self.layout:
+            return
+        self.callback(self.snapshot)
+
+
+class RefillTask(backgroundthread.Task):
+    def setup(self, snapshot, callback):
+        self.snapshot = snapshot
+        self.callback = callback
+        return self
+
+    def run(self):
+        if self.isCanceled():
+            return
+
+        self.callback(self.snapshot)
+
+
+class LibrarySnapshot(object):
+    """
+    The last known layout of a library listing for one combination of section, item type, filter, sort, unwatched
+    filter and subDir: its size, jump list and the ratingKey, label and thumb of every item fetched so far. The grid is
+    drawn from it right away while the listing is revalidated in the background. Kept in the metadata store.
+    """
+    def __init__(self, server, key, thumbDim):
+        self.server = server
+        self.key = key
+        self.thumbDim = thumbDim
+        self.totalSize = 0
+        self.jumpList = None
+        self.items = []
+        self.changed = False
+
+    def load(self):
+        """ Returns the stored layout as (totalSize, jumpList), or None. """
+        if not plexapp.util.METADATA_STORE:
+            return None
+
+        data = metadatastore.STORE.loadSnapshot(self.server.storeScope, self.key)
+        if not data:
+            return None
+
+        self.totalSize, self.jumpList, self.items = data['totalSize'], data['jumpList'], data['items']
+        util.DEBUG_LOG('Library snapshot: {0} items, {1} known', self.totalSize, lambda: sum(map(bool, self.items)))
+        return self.totalSize, self.jumpList
+
+    def setLayout(self, totalSize, jumpList):
+        self.totalSize = totalSize
+        self.jumpList = jumpList
+        self.items = [None] * totalSize
+        self.changed = True
+
+    def entry(self, pos):
+        item = pos < len(self.items) and self.items[pos]
+        if not item:
+            return None
+
+        ratingKey, label, thumb = item
+        return label, thumb and self.server.getImageTranscodeURL(thumb, *self.thumbDim) or ''
+
+    def record(self, pos, obj, label=None, thumb=None):
+        """ Remembers what's at pos; returns whether that differs from the snapshot. """
+        if pos >= len(self.items):
+            return True
+
+        item = [obj.ratingKey, label or '', thumb or ''] if obj else None
+        if self.items[pos] == item:
+            return False
+
+        self.items[pos] = item
+        self.changed = True
+        return True
+
+    def save(self):
+        if not self.changed or not plexapp.util.METADATA_STORE:
+            return
+
+        metadatastore.STORE.saveSnapshot(self.server.storeScope, self.key,
+                                         {'totalSize': self.totalSize, 'jumpList': self.jumpList, 'items': self.items})
+        self.changed = False
+
 
 class PhotoPropertiesTask(backgroundthread.Task):
     def setup(self, photo, callback):
@@ -362,6 +531,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
     # Needs to be an even multiple of 6(posters) and 10(small posters) and 12(list)
     # so that we fill an entire row
     CHUNK_SIZE = 240
+    CHUNK_UNIT = 60
     CHUNK_OVERCOMMIT = 6
     DEFAULT_ITEMS_CHUNK_SIZE = 250
     DEFAULT_ITEMS_CHUNK_SIZE_BIG = 500
@@ -375,7 +545,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.subDir = kwargs.get('subDir')
         self.keyItems = {}
         self.firstOfKeyItems = {}
-        self.tasks = backgroundthread.Tasks()
+        self.tasks = backgroundthread.TaskScope('library')
         self.backgroundSet = False
         self.showPanelControl = None
         self.keyListControl = None
@@ -383,6 +553,8 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.lastFocusID = None
         self.lastNonOptionsFocusID = None
         self.refill = False
+        self.snapshot = None
+        self.lastPrefetchPos = 0
 
         self.dcpjPos = 0
         self.dcpjThread = None
@@ -396,6 +568,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.reset()
 
         self.lock = threading.Lock()
+        self.fillLock = threading.RLock()
 
     def reset(self):
         PlaybackBtnMixin.reset(self)
@@ -408,6 +581,7 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.finalChunkPosition = 0
 
         self.CHUNK_SIZE = util.addonSettings.libraryChunkSize
+        self.chunkSizer = ChunkSizer(self.CHUNK_UNIT, self.CHUNK_SIZE)
 
         key = self.section.key
         if not key.isdigit():
@@ -424,6 +598,9 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
     @busy.dialog()
     def doClose(self):
         self.tasks.kill()
+        ipf.cancel()
+        if self.snapshot:
+            self.snapshot.save()
         kodigui.MultiWindow.doClose(self)
 
     def onFirstInit(self):
@@ -469,7 +646,9 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
             if action.getId() in MOVE_SET:
                 mli = self.showPanelControl.getSelectedItem()
                 if mli:
-                    self.requestChunk(mli.pos())
+                    pos = mli.pos()
+                    self.requestChunk(pos)
+                    self.prefetchImages(pos, mli)
 
                 if util.addonSettings.dynamicBackgrounds:
                     if mli and mli.dataSource:
@@ -1199,84 +1378,125 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
     def thumb_fallback(self):
         return 'script.plex/thumb_fallbacks/{0}.png'.format(TYPE_KEYS.get(self.section.type, TYPE_KEYS['movie'])['fallback'])
 
+    def snapshotKey(self):
+        return 'library:' + json.dumps([self.section.key, ITEM_TYPE or self.section.TYPE, self.getFilterOpts(),
+                                        self.getSortOpts(), self.filterUnwatched, self.subDir], separators=(',', ':'))
+
+    def fetchLayout(self):
+        """
+        Returns the total size of the current listing and its jump list as [key, title, size] entries (None if the
+        listing has no jump list), or None if the jump list couldn't be fetched.
+        """
+        type_ = getQueryItemType(self.section)
+
+        if self.sort != 'titleSort' or ITEM_TYPE in ('folder', 'episode') or self.subDir or self.section.TYPE == "collection":
+            if ITEM_TYPE == 'folder':
+                sectionAll = self.section.folder(0, 0, self.subDir)
+            else:
+                sectionAll = self.section.all(0, 0, filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, type_=type_)
+
+            return sectionAll.totalSize.asInt(), None
+
+        # find library collection mode setting, as we need to force-feed the collection type to the jumpList,
+        # if collection_mode is 2, otherwise the returned item count differs from /all with the same parameters
+        collection_mode = self.section.settings.get("collectionMode",
+                                                   {"value": plexobjects.PlexValue(2)})["value"].asInt()
+
+        jl_type = type_
+        if collection_mode == 2:
+            jl_type = getQueryItemType(self.section, fallback_to_section_type=True, force_include_collections=True)
+
+        jumpList = self.section.jumpList(filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, type_=jl_type)
+        if jumpList is None:
+            return None
+
+        jumpList = [[ji.key, ji.title, ji.size.asInt()] for ji in jumpList]
+        return sum(ji[2] for ji in jumpList), jumpList
+
+    def snapshotInvalidated(self, snapshot):
+        if snapshot is not self.snapshot:
+            return
+
+        util.DEBUG_LOG('Library snapshot is outdated, refilling')
+        self.tasks.cancel()
+        task = RefillTask().setup(snapshot, self.refillOutdated)
+        self.tasks.add(task)
+        backgroundthread.BGThreader.addTasksToFront([task])
+
+    def refillOutdated(self, snapshot):
+        with self.fillLock:
+            # the user may have refilled (sort, filter, ...) in the meantime
+            if snapshot is not self.snapshot:
+                return
+
+            self.snapshot = None
+            self.fillShows(useSnapshot=False)
+
     @busy.dialog()
-    def fillShows(self):
+    def fillShows(self, useSnapshot=True):
+        # user actions and the refill of an outdated snapshot may both fill, one at a time
+        with self.fillLock:
+            self._fillShows(useSnapshot)
+
+    def _fillShows(self, useSnapshot):
         self.setBoolProperty('no.content', False)
         self.setBoolProperty('no.content.filtered', False)
         self.setBoolProperty('content.filling', True)
-        items = []
         jitems = []
         self.keyItems = {}
         self.firstOfKeyItems = {}
-        totalSize = 0
         self.alreadyFetchedChunkList = set()
         self.finalChunkPosition = 0
 
-        type_ = getQueryItemType(self.section)
-
         tasks = []
 
-        if self.sort != 'titleSort' or ITEM_TYPE in ('folder', 'episode') or self.subDir or self.section.TYPE == "collection":
-            if ITEM_TYPE == 'folder':
-                sectionAll = self.section.folder(0, 0, self.subDir)
-            else:
-                sectionAll = self.section.all(0, 0, filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, type_=type_)
+        if self.snapshot:
+            self.snapshot.save()
 
-            totalSize = sectionAll.totalSize.asInt()
+        # draw the last known layout of this listing if we have it, and check it in the background
+        thumbDim = TYPE_KEYS.get(self.section.type, TYPE_KEYS['movie'])['thumb_dim']
+        self.snapshot = LibrarySnapshot(self.section.server, self.snapshotKey(), thumbDim)
+        cachedLayout = self.snapshot.load() if useSnapshot else None
+        layout = cachedLayout or self.fetchLayout()
 
-            if not totalSize:
-                self.showPanelControl.reset()
-                self.keyListControl.reset()
+        if not layout or not layout[0]:
+            self.showPanelControl.reset()
+            self.keyListControl.reset()
 
-                if self.filter or self.filterUnwatched:
-                    self.setBoolProperty('no.content.filtered', True)
-                else:
-                    self.setBoolProperty('no.content', True)
+            if self.filter or self.filterUnwatched:
+                self.setBoolProperty('no.content.filtered', True)
             else:
-                for startPosition in range(0, totalSize, self.getDefChunkSize(totalSize)):
-                    tasks.append(CreateDefaultItemsTask().setup(startPosition, self.getDefChunkSize(totalSize), totalSize, self.thumb_fallback, self._defaultItemsCallback))
-        else:
-            # find library collection mode setting, as we need to force-feed the collection type to the jumpList,
-            # if collection_mode is 2, otherwise the returned item count differs from /all with the same parameters
-            collection_mode = self.section.settings.get("collectionMode",
-                                                       {"value": plexobjects.PlexValue(2)})["value"].asInt()
-
-            jl_type = type_
-            if collection_mode == 2:
-                jl_type = getQueryItemType(self.section, fallback_to_section_type=True, force_include_collections=True)
-
-            jumpList = self.section.jumpList(filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, type_=jl_type)
+                self.setBoolProperty('no.content', True)
 
-            if not jumpList:
-                self.showPanelControl.reset()
-                self.keyListControl.reset()
+            if layout is None:
+                util.messageDialog("Error", "There was an error.")
 
-                if self.filter or self.filterUnwatched:
-                    self.setBoolProperty('no.content.filtered', True)
-                else:
-                    self.setBoolProperty('no.content', True)
-
-                if jumpList is None:
-                    util.messageDialog("Error", "There was an error.")
+            return
 
-                return
+        totalSize, jumpList = layout
+        if not cachedLayout:
+            self.snapshot.setLayout(totalSize, jumpList)
 
+        if jumpList is None:
+            for startPosition in range(0, totalSize, self.getDefChunkSize(totalSize)):
+                tasks.append(CreateDefaultItemsTask().setup(startPosition, self.getDefChunkSize(totalSize), totalSize, self.thumb_fallback, self._defaultItemsCallback, snapshot=self.snapshot))
+        else:
             idx = 0
-            for kidx, ji in enumerate(jumpList):
-                ji_size = ji.size.asInt()
-                mli = kodigui.ManagedListItem(ji.title, data_source=ji.key)
-                mli.setProperty('key', ji.key)
+            endPos = 0
+            for kidx, (key, title, size) in enumerate(jumpList):
+                mli = kodigui.ManagedListItem(title, data_source=key)
+                mli.setProperty('key', key)
                 mli.setProperty('original', '{0:02d}'.format(kidx))
-                self.keyItems[ji.key] = mli
+                self.keyItems[key] = mli
                 jitems.append(mli)
-                totalSize += ji_size
+                endPos += size
 
-                tasks.append(CreateDefaultItemsTask().setup(idx, ji.size.asInt(), totalSize, self.thumb_fallback, self._defaultItemsCallback, key=ji.key))
-                idx += ji_size
+                tasks.append(CreateDefaultItemsTask().setup(idx, size, endPos, self.thumb_fallback, self._defaultItemsCallback, key=key, snapshot=self.snapshot))
+                idx += size
 
             util.DEBUG_LOG('JumpList item size: {}', totalSize)
 
-            util.setGlobalProperty('key', jumpList[0].key)
+            util.setGlobalProperty('key', jumpList[0][0])
 
         self.setProperty("items.count", str(totalSize))
 
@@ -1287,8 +1507,9 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.tasks.add(tasks)
         backgroundthread.BGThreader.addTasksToFront(tasks)
 
-        # Wait for the default items to be created
-        while backgroundthread.BGThreader.working() and not util.MONITOR.abortRequested():
+        # Wait for our default items to be created; not for the whole queue, as a refill of an outdated snapshot
+        # runs this from a worker itself
+        while any(t.isValid() for t in tasks) and not util.MONITOR.abortRequested():
             util.MONITOR.waitForAbort(0.1)
 
         self.keyListControl.addItems(jitems)
@@ -1297,21 +1518,28 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
         self.setFocusId(self.POSTERS_PANEL_ID)
 
         tasks = []
-        for startChunkPosition in range(0, totalSize, self.CHUNK_SIZE):
+        if util.addonSettings.retrieveAllMediaUpFront:
+            for startChunkPosition in range(0, totalSize, self.CHUNK_SIZE):
+                tasks.append(
+                    ChunkRequestTask().setup(
+                        self.section, startChunkPosition, self.CHUNK_SIZE, self._chunkCallback, filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, subDir=self.subDir
+                    )
+                )
+        else:
+            # If we're retrieving media as we navigate then we just want to request the first
+            # chunk of media and stop.  We'll fetch the rest as the user navigates to those items
+            # Calculate the end chunk's starting position based on the totalSize of items
+            self.finalChunkPosition = (totalSize // self.CHUNK_UNIT) * self.CHUNK_UNIT
             tasks.append(
                 ChunkRequestTask().setup(
-                    self.section, startChunkPosition, self.CHUNK_SIZE, self._chunkCallback, filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, subDir=self.subDir
+                    self.section, 0, self.claimChunk(0), self._chunkCallback, filter_=self.getFilterOpts(), sort=self.getSortOpts(), unwatched=self.filterUnwatched, subDir=self.subDir,
+                    sizer=self.chunkSizer
                 )
             )
 
-            # If we're retrieving media as we navigate then we just want to request the first
-            # chunk of media and stop.  We'll fetch the rest as the user navigates to those items
-            if not util.addonSettings.retrieveAllMediaUpFront:
-                # Calculate the end chunk's starting position based on the totalSize of items
-                self.finalChunkPosition = (totalSize // self.CHUNK_SIZE) * self.CHUNK_SIZE
-                # Keep track of the chunks we've already fetched by storing the chunk's starting position
-                self.alreadyFetchedChunkList.add(startChunkPosition)
-                break
+        if cachedLayout:
+            tasks.append(LayoutRevalidateTask().setup(self.snapshot, self.fetchLayout, cachedLayout,
+                                                      self.snapshotInvalidated))
 
         self.tasks.add(tasks)
         backgroundthread.BGThreader.addTasksToFront(tasks)
@@ -1456,7 +1684,15 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
             self.lock.release()
             break
 
-    def _chunkCallback(self, items, start):
+    def _chunkCallback(self, items, start, final=True):
+        # streamed chunks arrive in batches; the content is filled once the last one is in
+        try:
+            self._setChunkItems(items, start)
+        finally:
+            if final:
+                self.setBoolProperty('content.filling', False)
+
+    def _setChunkItems(self, items, start):
         if not self.showPanelControl or not items:
             return
 
@@ -1470,9 +1706,19 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
             if not self.showPanelControl:
                 return
 
+            # only patch the positions whose item changed; remember what's at each position for the next time and
+            # count what has changed since the snapshot
+            snapshot = self.snapshot
+            record = snapshot.record if snapshot else lambda *args: True
+            changed = 0
+
             if ITEM_TYPE == 'episode':
                 for offset, obj in enumerate(items):
                     mli = self.showPanelControl[pos]
+                    if isSameRevision(mli, obj):
+                        pos += 1
+                        continue
+
                     if obj:
                         mli.dataSource = obj
                         mli.setProperty('index', str(pos))
@@ -1496,8 +1742,11 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
                             mli.setProperty('unwatched', '1')
                         mli.setBoolProperty('watched', obj.isFullyWatched)
                         mli.setProperty('initialized', '1')
+                        changed += record(pos, obj, mli.label, obj.defaultThumb)
                     else:
+                        changed += record(pos, None)
                         mli.clear()
+                        mli.dataSource = None
                         if obj is False:
                             mli.setProperty('index', str(pos))
                         else:
@@ -1508,6 +1757,10 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
             elif ITEM_TYPE == 'album':
                 for offset, obj in enumerate(items):
                     mli = self.showPanelControl[pos]
+                    if isSameRevision(mli, obj):
+                        pos += 1
+                        continue
+
                     if obj:
                         mli.dataSource = obj
                         mli.setProperty('index', str(pos))
@@ -1518,8 +1771,11 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
                         mli.setProperty('summary', obj.summary)
 
                         mli.setLabel2(obj.year)
+                        changed += record(pos, obj, mli.label, obj.defaultThumb)
                     else:
+                        changed += record(pos, None)
                         mli.clear()
+                        mli.dataSource = None
                         if obj is False:
                             mli.setProperty('index', str(pos))
                         else:
@@ -1530,6 +1786,10 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
                 for offset, obj in enumerate(items):
 
                     mli = self.showPanelControl[pos]
+                    if isSameRevision(mli, obj):
+                        pos += 1
+                        continue
+
                     if obj:
                         mli.setProperty('index', str(pos))
                         if obj.TYPE == 'track':
@@ -1565,8 +1825,12 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
                             mli.setProperty('initialized', '1')
 
                         mli.setProperty('progress', util.getProgressImage(obj))
+                        changed += record(pos, obj, mli.label,
+                                          obj.TYPE not in ('collection', 'photodirectory') and obj.defaultThumb)
                     else:
+                        changed += record(pos, None)
                         mli.clear()
+                        mli.dataSource = None
                         if obj is False:
                             mli.setProperty('index', str(pos))
                         else:
@@ -1574,26 +1838,54 @@ class LibraryWindow(mixins.PlaybackBtnMixin, kodigui.MultiWindow, windowutils.Ut
 
                     pos += 1
 
-        self.setBoolProperty('content.filling', False)
+            if snapshot:
+                util.DEBUG_LOG('Library chunk at {0}: {1} of {2} positions changed since the snapshot', start, changed,
+                               len(items))
+
+    def claimChunk(self, start):
+        """
+        Chunks vary in size, so alreadyFetchedChunkList keeps track of the CHUNK_UNIT sized blocks they cover. Claim the
+        blocks from start on for the next chunk, up to the current adaptive chunk size or the first block that has
+        already been requested, and return the chunk's size.
+        """
+        size = 0
+        pos = start
+        while size < self.chunkSizer.size and pos <= self.finalChunkPosition and pos not in self.alreadyFetchedChunkList:
+            self.alreadyFetchedChunkList.add(pos)
+            pos += self.CHUNK_UNIT
+            size += self.CHUNK_UNIT
+        return size
+
+    def prefetchImages(self, pos, mli):
+        if not util.addonSettings.imagePrefetch:
+            return
+
+        # the thumbnails coming into view next, in the direction we're scrolling
+        items = self.showPanelControl.items
+        if pos >= self.lastPrefetchPos:
+            positions = range(pos + 1, min(len(items), pos + 1 + ipf.MAX_PENDING))
+        else:
+            positions = range(pos - 1, max(-1, pos - 1 - ipf.MAX_PENDING), -1)
+        self.lastPrefetchPos = pos
+        ipf.update([items[p].thumbnailImage for p in positions], mli.thumbnailImage)
 
     def requestChunk(self, start):
         if util.addonSettings.retrieveAllMediaUpFront:
             return
 
         # Calculate the correct starting chunk position for the item they passed in
-        startChunkPosition = (start // self.CHUNK_SIZE) * self.CHUNK_SIZE
+        startChunkPosition = (start // self.CHUNK_UNIT) * self.CHUNK_UNIT
         # If we calculated a chunk position that's beyond the end chunk then just return
         if startChunkPosition > self.finalChunkPosition:
             return
 
         # Check if the chunk has already been requested, if not then go fetch the data
         if startChunkPosition not in self.alreadyFetchedChunkList:
-            util.DEBUG_LOG('Position {0} so requesting chunk {1}', start, startChunkPosition)
-            # Keep track of the chunks we've already fetched by storing the chunk's starting position
-            self.alreadyFetchedChunkList.add(startChunkPosition)
-            task = ChunkRequestTask().setup(self.section, startChunkPosition, self.CHUNK_SIZE,
+            size = self.claimChunk(startChunkPosition)
+            util.DEBUG_LOG('Position {0} so requesting chunk {1} ({2} items)', start, startChunkPosition, size)
+            task = ChunkRequestTask().setup(self.section, startChunkPosition, size,
                                             self._chunkCallback, filter_=self.getFilterOpts(), sort=self.getSortOpts(),
-                                            unwatched=self.filterUnwatched, subDir=self.subDir)
+                                            unwatched=self.filterUnwatched, subDir=self.subDir, sizer=self.chunkSizer)
 
             self.tasks.add(task)
             backgroundthread.BGThreader.addTasksToFront([task])
@@ -1,18 +1,16 @@
 from __future__ import absolute_import
 
-import hashlib
 import os
-import shutil
 import threading
 import time
 
-import requests
 from kodi_six import xbmc
 from kodi_six import xbmcgui
-from plexnet import plexapp, plexplayer, playqueue
+from plexnet import plexapp, plexplayer, playqueue, plexobjects
 from plexnet import util as plexnetUtil
 
 from lib import util, colors
+from lib.photo_cache import PhotoCache, PhotoPrefetcher, cacheName
 from . import busy
 from . import kodigui
 
@@ -43,7 +41,7 @@ class PhotoWindow(kodigui.BaseWindow):
 
     SLIDESHOW_INTERVAL = util.slideshowInterval
 
-    PHOTO_STACK_SIZE = 10
+    PREFETCH_AHEAD = 5
     tempSubFolder = ("p4k", "photos")
 
     def __init__(self, *args, **kwargs):
@@ -64,19 +62,14 @@ class PhotoWindow(kodigui.BaseWindow):
         self.showPhotoThread = None
         self.showPhotoTimeout = 0
         self.rotate = 0
-        self.tempFolder = None
-        self.photoStack = []
+        self.prefetcher = None
+        self.direction = 1
         self.initialLoad = True
 
     def onFirstInit(self):
-        self.tempFolder = os.path.join(util.translatePath("special://temp/"), *self.tempSubFolder)
-
-        if not os.path.exists(self.tempFolder):
-            try:
-                os.makedirs(self.tempFolder)
-            except OSError:
-                if not os.path.isdir(self.tempFolder):
-                    util.ERROR()
+        self.prefetcher = PhotoPrefetcher(
+            PhotoCache(os.path.join(util.translatePath("special://temp/"), *self.tempSubFolder))
+        )
 
         self.pqueueList = kodigui.ManagedControlList(self, self.PQUEUE_LIST_ID, 14)
         #self.setProperty('photo', 'script.plex/indicators/busy-photo.gif')
@@ -295,92 +288,100 @@ class PhotoWindow(kodigui.BaseWindow):
 
     def _showPhoto(self):
         """
-        load the current photo, preload the previous and the next one
+        show the current photo from the cache and have the next ones in slideshow direction downloaded in the
+        background, so moving on doesn't wait for the network
         :return:
         """
         photo = self.playQueue.current()
-        next = self.playQueue.getNext()
-        loadItems = (photo, next, self.playQueue.getPrev())
-        for item in loadItems:
-            if item is not None:
-                item.softReload()
-
+        photo.softReload()
         self.playerObject = plexplayer.PlexPhotoPlayer(photo)
 
-        addToStack = []
-        currentFailed = False
+        window = self.prefetchWindow(photo)
+        self.prefetcher.update(self.planDownloads(window))
+        if any(not item._reloaded for item in window):
+            threading.Thread(target=self.reloadWindow, args=(photo, window), name="photo.reload").start()
+
+        files = self.photoFiles(photo)
+        if not files:
+            return
+
+        names = [name for name, url in files]
         try:
-            for item in loadItems:
-                if not item:
-                    continue
-
-                if item.type != "photo":
-                    continue
-
-                meta = self.playerObject.build(item=item)
-                url = photo.server.getImageTranscodeURL(meta.get('url', ''), self.width, self.height)
-                bgURL = item.thumb.asTranscodedImageURL(self.width, self.height, blur=128, opacity=60,
-                                                        background=colors.noAlpha.Background)
-
-                isCurrent = currentFailed or item == photo
-                if isCurrent and not self.initialLoad:
-                    self.setBoolProperty('is.updating', True)
-
-                path, background = self.getCachedPhotoData(url, bgURL)
-                if not (path and background):
-                    currentFailed = True
-                    continue
-
-                if (path, background) not in self.photoStack:
-                    if item == next:
-                        # move the next image to the top of the stack
-                        addToStack.insert(0, (path, background))
-                    else:
-                        addToStack.append((path, background))
+            if not self.initialLoad and not self.prefetcher.ready(names):
+                self.setBoolProperty('is.updating', True)
 
-                if isCurrent:
-                    self._reallyShowPhoto(item, path, background)
-                    self.setBoolProperty('is.updating', False)
-                    self.initialLoad = False
-
-            # maintain cache folder
-            self.photoStack = addToStack + self.photoStack
-            if len(self.photoStack) > self.PHOTO_STACK_SIZE:
-                clean = self.photoStack[self.PHOTO_STACK_SIZE:]
-                self.photoStack = self.photoStack[:self.PHOTO_STACK_SIZE]
-                for remList in clean:
-                    for rem in remList:
-                        try:
-                            os.remove(rem)
-                        except:
-                            pass
+            if not self.prefetcher.wait(names):
+                if self.prefetcher.active and self.playQueue.current() == photo:
+                    util.ERROR("Couldn't load image: {0}".format(photo), notify=True)
+                return
+
+            self._reallyShowPhoto(photo, *[self.prefetcher.cache.get(name) for name in names])
+            self.initialLoad = False
         finally:
             self.setBoolProperty('is.updating', False)
 
-    def getCachedPhotoData(self, url, bgURL):
+    def prefetchWindow(self, photo):
+        """
+        the current photo, the next PREFETCH_AHEAD ones in slideshow direction and the one behind it
+        """
+        items = list(self.playQueue.items())
+        if photo not in items:
+            return [photo]
+
+        index = items.index(photo)
+        wrap = self.playQueue.isRepeat and not self.playQueue.isWindowed()
+        window = [photo]
+        for offset in list(range(1, self.PREFETCH_AHEAD + 1)) + [-1]:
+            pos = index + offset * self.direction
+            if wrap:
+                pos %= len(items)
+            elif not 0 <= pos < len(items):
+                continue
+
+            if items[pos].type == "photo" and items[pos] not in window:
+                window.append(items[pos])
+        return window
+
+    def planDownloads(self, window):
+        downloads = []
+        for item in window:
+            downloads += self.photoFiles(item) or []
+        return downloads
+
+    def reloadWindow(self, photo, window):
+        # items of the play queue might lack their media until reloaded; plan again once they have it
+        plexobjects.reloadItems(window, _soft=True)
+        if self.prefetcher.active and self.playQueue.current() == photo:
+            self.prefetcher.update(self.planDownloads(window))
+
+    def photoFiles(self, item):
+        """
+        the cache names and URLs of the photo and its background, or None if its media isn't known yet
+        """
+        try:
+            meta = plexplayer.PlexPhotoPlayer(item).build()
+        except (IndexError, AttributeError):
+            return None
+
+        if not meta:
+            return None
+
+        url = item.getServer().getImageTranscodeURL(meta.get('url', ''), self.width, self.height)
         if not url:
-            return
+            return None
 
-        basename = hashlib.sha1(url.encode('utf-8')).hexdigest()
-        tmpPath = os.path.join(self.tempFolder, basename)
-        tmpBgPath = os.path.join(self.tempFolder, "%s_bg" % basename)
-
-        for p, url in ((tmpPath, url), (tmpBgPath, bgURL)):
-            if not os.path.exists(p):# and not xbmc.getCacheThumbName(tmpFn):
-                try:
-                    r = requests.get(url, allow_redirects=True, timeout=10.0)
-                    r.raise_for_status()
-                except Exception as e:
-                    util.ERROR("Couldn't load image: %s" % e, notify=True)
-                    return None, None
-                else:
-                    try:
-                        with open(p, 'wb') as f:
-                            f.write(r.content)
-                    except:
-                        return None, None
+        bgURL = item.thumb.asTranscodedImageURL(self.width, self.height, blur=128, opacity=60,
+                                                background=colors.noAlpha.Background)
+        return (cacheName(url), url), (cacheName(url, '_bg'), bgURL)
 
-        return tmpPath, tmpBgPath
+    def isReady(self, item):
+        # whether showing the item won't wait for a download
+        files = item and self.photoFiles(item)
+        if not files:
+            return True
+
+        names = [name for name, url in files]
+        return self.prefetcher.ready(names) or not self.prefetcher.fetching(names)
 
     def _reallyShowPhoto(self, photo, path, background):
         self.setRotation(0)
@@ -443,6 +444,10 @@ class PhotoWindow(kodigui.BaseWindow):
         while not util.MONITOR.waitForAbort(0.1) and self.slideshowRunning:
             if not self.slideshowNext or time.time() < self.slideshowNext:
                 continue
+
+            # keep showing the current photo until the next one is downloaded
+            if not self.isReady(self.playQueue.getNext()):
+                continue
             self.next()
 
         if util.KODI_VERSION_MAJOR > 18:
@@ -465,11 +470,13 @@ class PhotoWindow(kodigui.BaseWindow):
     def prev(self):
         if not self.playQueue.getPrev():
             return
+        self.direction = -1
         self.showPhoto(trigger=lambda: self.playQueue.prev())
 
     def next(self):
         if not self.playQueue.getNext():
             return
+        self.direction = 1
         self.showPhoto(trigger=lambda: self.playQueue.next())
 
     __next__ = next
@@ -491,7 +498,8 @@ class PhotoWindow(kodigui.BaseWindow):
 
     def doClose(self):
         self.pause()
-        shutil.rmtree(self.tempFolder, ignore_errors=True)
+        if self.prefetcher:
+            self.prefetcher.shutdown()
 
         kodigui.BaseWindow.doClose(self)
 
@@ -17,6 +17,7 @@ from six.moves import range
 import lib.cache
 from lib import util
 from lib.kodijsonrpc import builtin
+from lib.trickplay import tpm
 from lib.util import T
 from . import busy
 from . import dropdown
@@ -1723,11 +1724,7 @@ class SeekDialog(kodigui.BaseDialog, PlexSubtitleDownloadMixin):
                     if skipMarker:
                         continue
 
-                    bifUrl = self.handler.player.playerObject.getBifUrl(offset)
-                    if "blur_chapters" in self.no_spoilers:
-                        bifUrl = self.player.video.server.getImageTranscodeURL(bifUrl,
-                                                                               *PlaylistDialog.LI_AR16X9_THUMB_DIM,
-                                                                               **thumb_opts)
+                    bifUrl = self.getBifImage(offset, PlaylistDialog.LI_AR16X9_THUMB_DIM, thumb_opts)
                     chaps.append((offset, bifUrl,
                                   label.format(" #{}".format(credCnt) if credits and creditsCounter > 1 else "")))
 
@@ -1871,6 +1868,21 @@ class SeekDialog(kodigui.BaseDialog, PlexSubtitleDownloadMixin):
         except RuntimeError:  # Not playing
             return 1
 
+    def getBifImage(self, offset, dims, blurOpts):
+        """
+        The preview image at offset; a local file from the trickplay index once it's loaded, the server's otherwise.
+        Blurred previews are always transcoded by the server.
+        """
+        blur = "blur_chapters" in self.no_spoilers
+        path = not blur and tpm.image(offset)
+        if path:
+            return path
+
+        bifUrl = self.handler.player.playerObject.getBifUrl(offset)
+        if blur:
+            bifUrl = self.player.video.server.getImageTranscodeURL(bifUrl, *dims, **blurOpts)
+        return bifUrl
+
     def updateProgress(self, set_to_current=True, offset=None, onlyTimeIndicator=False, no_osd=False):
         """
         Updates the progress bars (seek and position) and the currently-selected-time-label for the current position or
@@ -1916,11 +1928,8 @@ class SeekDialog(kodigui.BaseDialog, PlexSubtitleDownloadMixin):
 
         if not no_osd or (no_osd and not self.no_time_no_osd_spoilers):
             if self.hasBif:
-                bifUrl = self.handler.player.playerObject.getBifUrl(offset)
-                if "blur_chapters" in self.no_spoilers:
-                    bifUrl = self.player.video.server.getImageTranscodeURL(bifUrl,
-                                                                           *PlaylistDialog.LI_AR16X9_THUMB_DIM,
-                                                                           **{"blur": util.addonSettings.episodeNoSpoilerBlur})
+                bifUrl = self.getBifImage(offset, PlaylistDialog.LI_AR16X9_THUMB_DIM,
+                                          {"blur": util.addonSettings.episodeNoSpoilerBlur})
                 self.setProperty('bif.image', bifUrl)
                 self.bifImageControl.setPosition(bifx, 752)
 
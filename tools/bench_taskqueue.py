@@ -0,0 +1,115 @@
+# coding=utf-8
+"""
+Benchmark and sanity checks of the BGThreader task queue (lib/backgroundthread.py), run outside of Kodi:
+
+    python tools/bench_taskqueue.py [tasks]
+
+Enqueues the tasks, reprioritizes them with moveToFront and addTasksToFront the way the library and home windows do,
+then drains the queue.
+"""
+from __future__ import absolute_import, print_function
+import os
+import random
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'lib', '_included_packages')]
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+class _Addon(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def getAddonInfo(self, key):
+        return ''
+
+    def getSetting(self, key):
+        return ''
+
+    def setSetting(self, key, value):
+        pass
+
+
+class _Monitor(object):
+    def abortRequested(self):
+        return False
+
+
+# the Kodi modules and lib.util are only used for logging and the abort flag here
+_xbmc = _module('kodi_six.xbmc', LOGDEBUG=0, LOGINFO=1, LOGERROR=4, log=lambda *args: None)
+_xbmcaddon = _module('kodi_six.xbmcaddon', Addon=_Addon)
+_module('kodi_six', xbmc=_xbmc, xbmcaddon=_xbmcaddon, xbmcgui=_module('kodi_six.xbmcgui'),
+        xbmcvfs=_module('kodi_six.xbmcvfs'))
+_module('lib', __path__=[os.path.join(ROOT, 'lib')])
+_module('lib.util', MONITOR=_Monitor(), DEBUG_LOG=lambda *args, **kwargs: None, ERROR=lambda *args, **kwargs: None,
+        getSetting=lambda key, default=None: default)
+
+from lib import backgroundthread  # noqa: E402
+
+
+def check():
+    # a canceled task at the head of the queue still anchors addTasksToFront and moveToFront
+    threader = backgroundthread.BackgroundThreader('check', worker_count=0)
+    tasks = [backgroundthread.Task() for x in range(5)]
+    threader.addTasks(tasks)
+    tasks[0].cancel()
+    assert threader.getLowestPrority() == tasks[0]._priority
+
+    front = backgroundthread.Task()
+    threader.addTasksToFront([front])
+    assert front._priority < tasks[0]._priority
+
+    threader.moveToFront(tasks[3])
+    queue = threader._queue
+    order = []
+    while not queue.empty():
+        order.append(queue.get_nowait())
+        queue.task_done()
+    assert order == [tasks[3], front, tasks[1], tasks[2], tasks[4]], order
+
+    # tasks of the same priority come out in the order they were added
+    queue = backgroundthread.MutablePriorityQueue()
+    tasks = [backgroundthread.Task(p) for p in (3, 1, 2, 1, 3, 0, 2)]
+    for t in tasks:
+        queue.put(t)
+    order = [queue.get_nowait() for t in tasks]
+    assert order == sorted(tasks, key=lambda t: (t._priority, tasks.index(t)))
+    print('checks passed')
+
+
+def bench(count):
+    random.seed(1)
+    threader = backgroundthread.BackgroundThreader('bench', worker_count=0)
+    tasks = [backgroundthread.Task() for x in range(count)]
+
+    start = time.time()
+    threader.addTasks(tasks)
+    for x in range(count):
+        threader.moveToFront(random.choice(tasks))
+    for x in range(count // 50):
+        threader.addTasksToFront([backgroundthread.Task() for y in range(5)])
+    enqueued = time.time()
+
+    queue = threader._queue
+    drained = 0
+    while not queue.empty():
+        queue.get_nowait()
+        queue.task_done()
+        drained += 1
+
+    print('{0} tasks, {0} moveToFront, {1} addTasksToFront(5): enqueue {2:.0f}ms, drain {3} {4:.0f}ms'.format(
+        count, count // 50, (enqueued - start) * 1000, drained, (time.time() - enqueued) * 1000))
+
+
+if __name__ == '__main__':
+    check()
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)